@@ -0,0 +1,44 @@
+# 页面交互耗时基准: 用 Streamlit AppTest 无头运行 es_app.py，
+# 分别计时冷启动、整页重跑、以及在 Single Track Analyzer 里切换歌曲
+# 用法: python -m benchmarks.bench_app_rerun --repeat 10
+# 读取本地历史库 (es_data/store)，需要先有数据 (python -m es_tracker.store migrate)
+import os
+import time
+import argparse
+import statistics
+
+from streamlit.testing.v1 import AppTest
+
+from es_tracker.config import ROOT_DIR
+
+APP_PATH = os.path.join(ROOT_DIR, "es_app.py")
+
+def timed_run(at):
+    t0 = time.perf_counter()
+    at.run()
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    return time.perf_counter() - t0
+
+def summarize(label, samples):
+    print(f"{label:<24}: median {statistics.median(samples) * 1000:8.1f} ms   min {min(samples) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    print(f"cold start              : {timed_run(at) * 1000:8.1f} ms")
+    if not at.selectbox: raise SystemExit("no song history in the store; nothing to interact with")
+
+    summarize("full rerun", [timed_run(at) for _ in range(args.repeat)])
+
+    # 同一批歌切换两轮: 第一轮是首次查看，第二轮是看过的歌
+    options = at.selectbox[0].options
+    picks = [options[(i + 1) % len(options)] for i in range(args.repeat)]
+    for label in ("switch song (first)", "switch song (revisit)"):
+        samples = []
+        for song in picks:
+            at.selectbox[0].set_value(song)
+            samples.append(timed_run(at))
+        summarize(label, samples)
@@ -0,0 +1,31 @@
+# 图表 payload 基准: 全量每日点 vs 按跨度汇总 + LTTB 降采样后的 Vega-Lite spec 大小
+# 用法: python -m benchmarks.bench_chart_payload --days 1095 --songs 500
+import json
+import argparse
+
+from benchmarks.bench_history import make_synthetic_history, timed
+from es_tracker.history import build_history_tables, chart_tables, song_chart_table, _build_rollups, SongIndex
+
+def spec_size(df, y_columns):
+    # 图表内嵌数据的 JSON 字节数 (与 es_app 的图表同样的长表结构)
+    melted = df[["Date"] + y_columns].melt("Date", var_name="Series", value_name="Value")
+    return len(json.dumps(melted.to_dict("records")))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365 * 3)
+    parser.add_argument("--songs", type=int, default=500)
+    args = parser.parse_args()
+
+    total, daily, songs = build_history_tables(make_synthetic_history(args.days, args.songs))
+    editions = [c for c in total.columns if c != "Date"]
+    rollups, t_roll = timed(_build_rollups, total, daily)
+    index = SongIndex(songs)
+    song = index.names[0]
+    print(f"synthetic history: {args.days} days; rollups built in {t_roll * 1000:.1f} ms")
+    print(f"{'range':<6} {'res':<4} {'points':>7} {'total spec':>12} {'song spec':>11}")
+    print(f"{'raw':<6} {'D':<4} {len(total):>7} {spec_size(total, editions):>12,} {spec_size(index.get(song), ['Streams', 'Daily']):>11,}")
+    for label, days in (("1M", 31), ("3M", 92), ("1Y", 366), ("All", None)):
+        t, _, res = chart_tables(total, daily, rollups, days)
+        s, _ = song_chart_table(index.get(song), days)
+        print(f"{label:<6} {res:<4} {len(t):>7} {spec_size(t, editions):>12,} {spec_size(s, ['Streams', 'Daily']):>11,}")
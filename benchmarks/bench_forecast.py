@@ -0,0 +1,43 @@
+# 里程碑预测基准: 逐条序列拟合的 Python 循环 vs 整个矩阵一次 NumPy 批量拟合
+# 用法: python -m benchmarks.bench_forecast --days 365 --songs 350
+import argparse
+import numpy as np
+
+from benchmarks.bench_history import make_synthetic_history, timed
+from es_tracker.forecast import forecast_milestones, stream_matrix, fit_trends, HALF_LIFE
+from es_tracker.history import build_history_tables
+
+def looped_fit(matrix, half_life=HALF_LIFE):
+    # 对照实现: 每条序列单独做一次加权 polyfit
+    rate, decay = np.zeros(len(matrix)), np.zeros(len(matrix))
+    for i, row in enumerate(matrix):
+        daily = np.diff(row)
+        x = np.arange(len(daily), dtype="float64")
+        ok = ~np.isnan(daily)
+        if ok.sum() < 2: continue
+        w = 0.5 ** ((x[-1] - x[ok]) / half_life)
+        slope, intercept = np.polyfit(x[ok], np.log1p(np.clip(daily[ok], 0, None)), 1, w=np.sqrt(w))
+        decay[i] = min(slope, 0.0)
+        rate[i] = max(np.expm1(intercept + slope * x[-1]), 0)
+    return rate, decay
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--songs", type=int, default=350)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    hist_total, _, hist_songs = build_history_tables(make_synthetic_history(args.days, args.songs))
+    _, _, _, matrix = stream_matrix(hist_total, hist_songs)
+    print(f"series matrix: {matrix.shape[0]} series x {matrix.shape[1]} days")
+
+    (old_rate, old_decay), t_old = timed(looped_fit, matrix)
+    (new_rate, new_decay), t_new = timed(fit_trends, matrix)
+    np.testing.assert_allclose(new_rate, old_rate, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(new_decay, old_decay, rtol=1e-6, atol=1e-9)
+
+    t_full = min(timed(forecast_milestones, hist_total, hist_songs)[1] for _ in range(args.repeat))
+    print(f"per-series polyfit loop : {t_old * 1000:8.2f} ms")
+    print(f"batched fit             : {t_new * 1000:8.2f} ms")
+    print(f"full forecast (+matrix) : {t_full * 1000:8.2f} ms")
@@ -0,0 +1,93 @@
+# 历史流水线基准: 旧的逐日 iterrows 循环 vs 批量 groupby
+# 用法: python -m benchmarks.bench_history --days 1095 --songs 500
+import time
+import random
+import argparse
+import pandas as pd
+from datetime import date, timedelta
+
+from es_tracker.classify import is_relevant_track
+from es_tracker.editions import EDITION_COLUMNS, EDITION_SETS, UNIVERSE, UNIVERSE_KEYWORDS
+from es_tracker.history import build_history_tables
+from es_tracker.utils import fix_encoding
+
+def make_synthetic_history(n_days, n_songs, seed=0):
+    rng = random.Random(seed)
+    # 一部分歌名命中专辑 (含各种版本后缀)，其余是无关曲目
+    names = sorted(set().union(*EDITION_SETS.values()))
+    suffixes = [" - live", " - a cappella", " - instrumental", " - slowed", " (sped up)"]
+    while len(names) < n_songs // 3:
+        names.append(rng.choice(UNIVERSE_KEYWORDS) + rng.choice(suffixes) + f" {len(names)}")
+    while len(names) < n_songs:
+        names.append(f"* Unrelated Song {len(names)}")
+    names = [n.replace("'", "â€™") if rng.random() < 0.2 else n for n in names]
+
+    start = date(2024, 1, 1)
+    streams = [rng.randint(1_000_000, 500_000_000) for _ in names]
+    frames = []
+    for i in range(n_days):
+        daily = [rng.randint(0, 500_000) for _ in names]
+        streams = [s + d for s, d in zip(streams, daily)]
+        frames.append(pd.DataFrame({
+            "Date": (start + timedelta(days=i)).isoformat(),
+            "Song": names, "Streams_Num": streams, "Daily_Raw": daily,
+            # 合成数据里累计值正好按 daily 增长，派生的 Daily_Num 与 Daily_Raw 相同
+            "Daily_Num": daily,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def legacy_history_tables(history):
+    # 改造前 get_historical_charts_data() 的逐日逐行实现
+    records_total = []
+    records_daily = []
+    song_history_list = []
+    for date_str, df in history.groupby('Date', sort=True):
+        df = df.copy()
+        df['Song'] = df['Song'].apply(fix_encoding)
+        df['Song_Lower'] = df['Song'].str.lower().str.strip()
+        df['is_valid'] = df['Song'].apply(is_relevant_track)
+        valid_tracks = df[df['is_valid']]
+        for _, row in valid_tracks.iterrows():
+            song_history_list.append({"Date": date_str, "Song": row['Song'], "Streams": row['Streams_Num'], "Daily": row['Daily_Raw']})
+        # 每个版本各扫一遍
+        total, daily = {"Date": date_str}, {"Date": date_str}
+        for edition, songs in EDITION_SETS.items():
+            subset = df[df['Song_Lower'].isin(songs)]
+            total[edition], daily[edition] = subset['Streams_Num'].sum(), subset['Daily_Raw'].sum()
+        total[UNIVERSE], daily[UNIVERSE] = valid_tracks['Streams_Num'].sum(), valid_tracks['Daily_Raw'].sum()
+        records_total.append(total)
+        records_daily.append(daily)
+    return pd.DataFrame(records_total), pd.DataFrame(records_daily), pd.DataFrame(song_history_list)
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365 * 3)
+    parser.add_argument("--songs", type=int, default=500)
+    args = parser.parse_args()
+
+    history = make_synthetic_history(args.days, args.songs)
+    print(f"synthetic history: {args.days} days x {args.songs} songs = {len(history):,} rows")
+
+    (old_total, old_daily, old_songs), t_old = timed(legacy_history_tables, history)
+    (new_total, new_daily, new_songs), t_new = timed(build_history_tables, history)
+
+    # 两种实现结果必须一致
+    cols = ["Date"] + EDITION_COLUMNS
+    pd.testing.assert_frame_equal(old_total[cols], new_total[cols], check_dtype=False)
+    pd.testing.assert_frame_equal(old_daily[cols], new_daily[cols], check_dtype=False)
+    old_songs = old_songs.sort_values(["Date", "Song"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(old_songs, new_songs.to_frame().astype({"Song": object}), check_dtype=False)
+
+    print(f"legacy iterrows loop : {t_old:8.3f} s")
+    print(f"batched pipeline     : {t_new:8.3f} s")
+    print(f"speedup              : {t_old / t_new:8.1f}x")
+    # 单曲历史的常驻内存: 每天一份歌名字符串的长表 vs 曲目键/显示名/日期各一份 + 定宽整数矩阵
+    long_bytes = old_songs.memory_usage(deep=True).sum()
+    names_bytes = sum(pd.Series(a).memory_usage(deep=True) for a in (new_songs.keys, new_songs.names, new_songs.dates))
+    print(f"song history (long)  : {long_bytes / 1e6:8.1f} MB")
+    print(f"song history (matrix): {(new_songs.nbytes + names_bytes) / 1e6:8.1f} MB")
@@ -0,0 +1,76 @@
+# 历史聚合增量更新基准 + 正确性检查: 在临时目录里建合成历史库 (每首歌带 Track_ID)，依次模拟
+# 追加新的一天、同一天重新抓取、改动很早的一天、某首歌从最近一天消失。
+# 每一步计时增量更新 (history.update_aggregates)，并和同一份库从头重建的结果逐项比较，不一致时报错
+# 用法: python -m benchmarks.bench_history_incremental --days 365 --songs 300
+import os
+import time
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_history import make_synthetic_history
+from es_tracker import history, store
+
+def with_track_ids(df):
+    ids = {s: hashlib.md5(s.encode("utf-8")).hexdigest()[:22] for s in df["Song"].unique()}
+    return df.assign(Track_ID=df["Song"].map(ids))
+
+def assert_same(cache, fresh):
+    # 增量更新的结果必须和从头重建的一致
+    for name in ("total", "daily"):
+        pd.testing.assert_frame_equal(cache[name].reset_index(drop=True), fresh[name].reset_index(drop=True), check_dtype=False)
+    a, b = cache["songs"], fresh["songs"]
+    assert list(a.keys) == list(b.keys), "song keys differ"
+    assert list(a.names) == list(b.names), "display names differ"
+    assert list(a.dates) == list(b.dates), "dates differ"
+    for field in ("streams", "daily", "editions"): np.testing.assert_array_equal(getattr(a, field), getattr(b, field))
+    assert cache["song_index"].names == fresh["song_index"].names, "song index differs"
+    got, want = cache["rolling"].stats(), fresh["rolling"].stats()
+    for days in want:
+        assert got[days]["days"] == want[days]["days"], f"{days}-day window covers different days"
+        np.testing.assert_allclose(list(got[days]["sums"].values()), list(want[days]["sums"].values()), rtol=1e-9)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--songs", type=int, default=300)
+    args = parser.parse_args()
+
+    synthetic = with_track_ids(make_synthetic_history(args.days, args.songs))
+    days = {d: day.drop(columns=["Date"]).reset_index(drop=True) for d, day in synthetic.groupby("Date", sort=True)}
+    dates = sorted(days)
+    first, last = dates[0], dates[-1]
+    dropped = days[last]["Song"].iloc[0]
+
+    def refetched(df):
+        return df.assign(Streams_Num=df["Streams_Num"] + 7, Daily_Num=df["Daily_Num"] + 7)
+
+    steps = [
+        ("append", {last: days[last]}),
+        ("refetch", {last: refetched(days[last])}),
+        ("old-day edit", {first: days[first].assign(Streams_Num=days[first]["Streams_Num"] + 1)}),
+        ("song drop", {last: refetched(days[last])[lambda df: df["Song"] != dropped]}),
+    ]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store_dir = os.path.join(work_dir, "store")
+        cache_path = os.path.join(work_dir, "history_agg.pkl")
+        fresh_path = os.path.join(work_dir, "history_fresh.pkl")
+        store.append_days({d: days[d] for d in dates[:-1]}, store_dir=store_dir)
+        t0 = time.perf_counter()
+        history.update_aggregates(store_dir, cache_path)
+        print(f"synthetic history: {args.days} days x {args.songs} songs; full build {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+        for label, change in steps:
+            store.append_days(change, store_dir=store_dir)
+            t0 = time.perf_counter()
+            cache = history.update_aggregates(store_dir, cache_path)
+            t_inc = time.perf_counter() - t0
+            if os.path.exists(fresh_path): os.remove(fresh_path)
+            t0 = time.perf_counter()
+            fresh = history.update_aggregates(store_dir, fresh_path)
+            t_full = time.perf_counter() - t0
+            assert_same(cache, fresh)
+            print(f"{label:<14}: incremental {t_inc * 1000:8.1f} ms   full rebuild {t_full * 1000:8.1f} ms   (same result)")
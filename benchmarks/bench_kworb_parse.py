@@ -0,0 +1,67 @@
+# kworb 页面解析基准: pd.read_html + 逐格 clean_number vs 定向 lxml 解析
+# 用法: python -m benchmarks.bench_kworb_parse [--page saved_kworb.html] [--songs 2000]
+import io
+import time
+import argparse
+import pandas as pd
+
+from es_tracker import store
+from es_tracker.kworb import parse_songs_table
+from es_tracker.utils import clean_number
+from benchmarks.synthetic import make_kworb_page
+
+def legacy_parse(content):
+    # 改造前 get_kworb_data() + process_data_with_history() 的解析部分
+    dfs = pd.read_html(io.StringIO(content.decode("utf-8")))
+    for table in dfs:
+        if 'Song Title' in table.columns:
+            df = table.rename(columns={'Song Title': 'Song'}).copy()
+            df['Streams_Num'] = df['Streams'].apply(clean_number)
+            df['Daily_Raw'] = df['Daily'].apply(clean_number)
+            return df[['Song', 'Streams_Num', 'Daily_Raw']]
+    return None
+
+def synthetic_page(n_songs):
+    # 以历史库最新一天为底，不够的话重复编号凑够 n_songs 首
+    latest = store.latest_date()
+    base = store.read_day(latest) if latest else pd.DataFrame({"Song": ["* Song"], "Streams_Num": [1000], "Daily_Raw": [10]})
+    reps = -(-n_songs // len(base))
+    songs, streams, daily = [], [], []
+    for i in range(reps):
+        for row in base.itertuples(index=False):
+            songs.append(row.Song if i == 0 else f"{row.Song} ({i})")
+            streams.append(int(row.Streams_Num))
+            daily.append(int(row.Daily_Raw))
+    return make_kworb_page(songs[:n_songs], streams[:n_songs], daily[:n_songs]).encode("utf-8")
+
+def best_of(fn, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(arg)
+        times.append(time.perf_counter() - t0)
+    return out, min(times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", help="saved copy of a kworb songs page (default: synthetic page)")
+    parser.add_argument("--songs", type=int, default=2000, help="rows in the synthetic page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "rb") as f: content = f.read()
+    else:
+        content = synthetic_page(args.songs)
+    print(f"page: {len(content) / 1024:,.0f} KB")
+
+    old, t_old = best_of(legacy_parse, content, args.repeat)
+    new, t_new = best_of(parse_songs_table, content, args.repeat)
+
+    # 两种实现结果必须一致
+    pd.testing.assert_frame_equal(old.reset_index(drop=True), new[['Song', 'Streams_Num', 'Daily_Raw']], check_dtype=False)
+
+    print(f"rows                 : {len(new):,} ({new['Track_ID'].notna().sum():,} with track id)")
+    print(f"read_html + apply    : {t_old * 1000:8.1f} ms")
+    print(f"targeted lxml parse  : {t_new * 1000:8.1f} ms")
+    print(f"speedup              : {t_old / t_new:8.1f}x")
@@ -0,0 +1,164 @@
+# 合成规模的端到端基准: 在临时目录里生成 天数 × 歌数 的历史库 (含编码错乱、需要 fix_encoding 修正的歌名)，
+# 用本地 HTTP 服务冒充 kworb 歌曲页，依次计时各个热点阶段。
+# 每次的结果追加进 benchmarks/results/suite.jsonl，并和上一次同规模的结果比较，变慢超过阈值时退出码为 1
+# 用法: python -m benchmarks.suite --days 1095 --songs 500 [--repeat 5] [--threshold 0.25] [--no-record]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.bench_history import make_synthetic_history
+from benchmarks.synthetic import make_kworb_page
+from es_tracker import charts, dashboard, forecast, history, ingest, store
+from es_tracker.config import ROOT_DIR
+from es_tracker.kworb import parse_songs_table
+from es_tracker.metrics import derive_daily_metrics, normalize_kworb_table
+
+RESULTS_PATH = os.path.join(ROOT_DIR, "benchmarks", "results", "suite.jsonl")
+NOISE_FLOOR_MS = 1.0  # 低于这个差值的变化不算退化
+
+# --- 本地 kworb ---
+def serve_page(content):
+    # 任何路径都返回同一份页面; 返回 (url, server)
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/spotify/artist/synthetic_songs.html", server
+
+def build_store(history_df, store_dir):
+    days = {d: day.drop(columns=["Date"]) for d, day in history_df.groupby("Date", sort=True)}
+    store.append_days(days, store_dir=store_dir)
+
+def measure(fn, repeat, setup=None):
+    # 返回 (最后一次的结果, [每次的毫秒数])
+    samples, out = [], None
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return out, samples
+
+def run_suite(n_days, n_songs, repeat, work_dir):
+    store_dir = os.path.join(work_dir, "store")
+    cache_path = os.path.join(work_dir, "history_agg.pkl")
+    results = {}
+
+    def stage(name, fn, setup=None, times=repeat):
+        out, samples = measure(fn, times, setup)
+        results[name] = samples
+        return out
+
+    history_df = make_synthetic_history(n_days, n_songs)
+    stage("store_build", lambda: build_store(history_df, store_dir), times=1)
+    stage("recompute", lambda: store.recompute(store_dir=store_dir), times=1)
+
+    # 下一天的 kworb 页: 在最后一天的基础上每首歌再涨一天
+    last_date = store.latest_date(store_dir=store_dir)
+    last_day = store.read_day(last_date, store_dir=store_dir)
+    page = make_kworb_page(last_day["Song"], last_day["Streams_Num"] + last_day["Daily_Raw"], last_day["Daily_Raw"]).encode("utf-8")
+    # 先走一遍真正的抓取路径，确认本地页面能抓能解析; 计时只算解析: 重复请求同一 host 会被
+    # fetch.HostLimiter 的请求间隔拖住，测到的主要是 sleep
+    url, server = serve_page(page)
+    try: raw_df = ingest.get_kworb_data({"id": "synthetic", "url": url})
+    finally: server.shutdown()
+    if raw_df is None: raise RuntimeError("local kworb page did not parse")
+    stage("parse", lambda: parse_songs_table(page))
+
+    prev_df = last_day[store.RAW_COLUMNS]
+    stage("derive_metrics", lambda: derive_daily_metrics(normalize_kworb_table(raw_df), prev_df))
+    latest = stage("load_latest_day", lambda: dashboard.load_latest_day(store_dir))
+    final_df = stage("filter_and_categorize", lambda: dashboard.filter_and_categorize(latest, tracks=store.read_aliases(store_dir)))
+    stage("edition_summary", lambda: dashboard.edition_summary(final_df))
+
+    def drop_cache():
+        if os.path.exists(cache_path): os.remove(cache_path)
+    stage("history_cold", lambda: history.update_aggregates(store_dir, cache_path), setup=drop_cache)
+    total, daily, songs, _ = stage("history_warm", lambda: history.get_historical_charts_data(store_dir, cache_path))
+    cache = history.update_aggregates(store_dir, cache_path)
+    stage("forecast", lambda: forecast.forecast_milestones(total, songs))
+
+    def macro_charts():
+        t, d, _ = history.chart_tables(total, daily, cache["rollups"])
+        return charts.chart_spec(charts.make_macro_chart(t, "", is_total=True)), charts.chart_spec(charts.make_macro_chart(d, ""))
+    stage("macro_charts", macro_charts)
+
+    index = cache["song_index"]
+    song = index.names[0]
+    def song_chart():
+        song_df, _ = history.song_chart_table(index.get(song))
+        return charts.chart_spec(charts.make_single_song_chart(song_df, song))
+    stage("song_chart", song_chart)
+    return results
+
+# --- 记录 + 比较 ---
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception: return None
+
+def previous_record(n_days, n_songs, path=RESULTS_PATH):
+    if not os.path.exists(path): return None
+    prev = None
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec["days"] == n_days and rec["songs"] == n_songs: prev = rec
+    return prev
+
+def append_record(record, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f: f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365 * 3)
+    parser.add_argument("--songs", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.25, help="flag stages slower than the last run by this fraction")
+    parser.add_argument("--no-record", action="store_true", help="compare only, don't append this run to the results file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_suite(args.days, args.songs, args.repeat, work_dir)
+    medians = {name: statistics.median(samples) for name, samples in results.items()}
+    prev = previous_record(args.days, args.songs)
+
+    print(f"synthetic history: {args.days} days x {args.songs} songs" + (f"; compared with {prev['at']} ({prev.get('commit')})" if prev else ""))
+    print(f"{'stage':<24}{'median ms':>12}{'min ms':>10}{'last ms':>10}{'change':>9}")
+    regressions = []
+    for name, samples in results.items():
+        last = prev["stages"].get(name) if prev else None
+        change = ""
+        if last:
+            change = f"{(medians[name] - last) / last:+.0%}"
+            if medians[name] > last * (1 + args.threshold) and medians[name] - last > NOISE_FLOOR_MS:
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<24}{medians[name]:>12.1f}{min(samples):>10.1f}{(f'{last:.1f}' if last else '-'):>10}{change:>9}")
+
+    if not args.no_record:
+        append_record({
+            "at": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+            "days": args.days, "songs": args.songs, "repeat": args.repeat,
+            "stages": {name: round(v, 3) for name, v in medians.items()},
+        })
+    if regressions:
+        print(f"regressions (> {args.threshold:.0%} slower): {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,23 @@
+# 基准用的合成数据: kworb 风格的歌曲页
+import html
+import hashlib
+
+def make_kworb_page(songs, streams, daily):
+    # 结构仿照 kworb 艺人歌曲页: 先是一张汇总表，然后是带 'Song Title' 表头的歌曲表
+    rows = []
+    for name, s, d in zip(songs, streams, daily):
+        star = name.startswith("* ")
+        title = name[2:] if star else name
+        track_id = hashlib.md5(title.encode()).hexdigest()[:22]
+        rows.append(
+            f'<tr><td class="text"><div>{"* " if star else ""}<a href="https://open.spotify.com/track/{track_id}">'
+            f'{html.escape(title)}</a></div></td><td>{s:,}</td><td>{d:,}</td></tr>'
+        )
+    return (
+        '<html><head><meta charset="utf-8"><title>Spotify Songs</title></head><body><div class="container">'
+        '<table><thead><tr><th></th><th>Total</th><th>As lead</th><th>Solo</th><th>As feature</th></tr></thead>'
+        '<tbody><tr><td>Streams</td><td>1,000</td><td>900</td><td>800</td><td>100</td></tr></tbody></table>'
+        '<table class="addpos sortable"><thead><tr><th class="text">Song Title</th><th>Streams</th><th>Daily</th></tr></thead><tbody>\n'
+        + "\n".join(rows)
+        + '\n</tbody></table></div></body></html>'
+    )
@@ -1,106 +1,67 @@
 import streamlit as st
 import pandas as pd
-import requests
 import os
 import glob
-import base64
 import random
-import altair as alt
 import math
 from datetime import datetime, timedelta
 
-# --- 1. 基础路径配置 ---
-# 获取当前代码文件所在的文件夹路径
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-
-# 假设你的图片放在代码同级目录下的 'images' 文件夹中
-IMAGE_DIR_PATH = os.path.join(CURRENT_DIR, "esimages") 
-
-# 数据文件夹放在代码同级目录下的 'es_data' 文件夹中
-DATA_DIR_PATH = os.path.join(CURRENT_DIR, "es_data")
+from es_tracker import assets, charts, dashboard, forecast, history, ingest, perf, store
+from es_tracker.assets import IMAGE_DIR_PATH
+from es_tracker.charts import PRIMARY_COLOR, SECONDARY_COLOR, POSITIVE_COLOR, NEGATIVE_COLOR
+from es_tracker.config import DATA_DIR_PATH
+from es_tracker.editions import DEFAULT_RULES
 
+# --- 1. 页面配置 ---
 # 移除了 page_icon 中的 emoji
 st.set_page_config(page_title="ES Deluxe Tracker", layout="wide")
-
-# --- 2. 全局筛选标准 ---
-UNIVERSE_KEYWORDS = [
-    "eternal sunshine", "intro (end of the world)", "bye", "don't wanna break up again",
-    "saturn returns interlude", "supernatural", "true story", "the boy is mine",
-    "yes, and?", "we can't be friends", "i wish i hated you", "imperfect for you",
-    "ordinary things", "twilight zone", "warm", "dandelion", "past life", "hampstead"
-]
-
-def is_relevant_track(name):
-    n = name.lower()
-    if "we can" in n and "friends" in n and "live" in n: return True
-    if "don" in n and "wanna" in n and "live" in n: return True
-    return any(k in n for k in UNIVERSE_KEYWORDS)
-
-# --- 3. 工具函数 ---
-def get_img_base64(file_name):
-    possible_exts = ['.jpg', '.png', '.webp', '.jpeg']
-    file_path = None
-    direct_path = os.path.join(IMAGE_DIR_PATH, file_name)
-    if os.path.exists(direct_path):
-        file_path = direct_path
-    else:
-        base_name = os.path.splitext(file_name)[0]
-        for ext in possible_exts:
-            temp_path = os.path.join(IMAGE_DIR_PATH, base_name + ext)
-            if os.path.exists(temp_path):
-                file_path = temp_path
-                break
-    if not file_path: return ""
-    with open(file_path, "rb") as f: data = f.read()
-    encoded = base64.b64encode(data).decode()
-    if file_path.endswith('.png'): mime = 'image/png'
-    elif file_path.endswith('.webp'): mime = 'image/webp'
-    else: mime = 'image/jpeg'
-    return f"data:{mime};base64,{encoded}"
-
-def clean_number(x):
-    try: return int(str(x).replace(',', '').replace('+', '').split('.')[0])
-    except: return 0
-
-def fix_encoding(s):
-    if not isinstance(s, str): return s
-    s = s.replace("â€™", "'").replace("â\x80\x99", "'").replace("’", "'")
-    s = s.replace("â€“", "-").replace("â\x80\x93", "-").replace("–", "-")
-    return s
-
-# --- 4. 随机背景 ---
-search_pattern = os.path.join(IMAGE_DIR_PATH, "imgi_*.jpg")
-bg_candidates = glob.glob(search_pattern)
-if not bg_candidates: 
-    bg_candidates = glob.glob(os.path.join(IMAGE_DIR_PATH, "*.jpg"))
-
-specific_bgs = [
-    "ab67616d0000b2738e7e2c150cdfe189f7584fc4.jpg",
-    "ab67616d00001e0296094d0c80f0f321da705f88.jpg",
-    "c05ac5704cafd9d1242c0225e5c2ce67.1000x1000x1.png",
-    "c96f76385524a89fea9f1fa731113c6a.1000x1000x1.png",
-    "c1646624c824a8fadb6640002a43afe4.1000x1000x1.png",
-    "d2e07aab978bc9c5270a3113587205fe.1000x1000x1.png",
-    "e2da24f179bcc16641dac283bd5ad4e1.1000x1000x1.png",
-    "ab67616d00001e0207894829ab71aac2e995f425.jpg"
-]
-
-for bg_file in specific_bgs:
-    full_path = os.path.join(IMAGE_DIR_PATH, bg_file)
-    if os.path.exists(full_path):
-        bg_candidates.append(full_path)
-
+# 这一轮重跑的分阶段计时 (地址栏加 ?debug=perf 在页面底部显示)
+perf_run = perf.begin_run()
+
+# --- 2. 工具函数 ---
+# 图片按槽位缩成 WebP 缩略图，走静态文件 URL (见 .streamlit/config.toml 的 enableStaticServing)
+def get_img_url(file_name, slot):
+    if not file_name: return ""
+    return assets.get_asset_url(file_name, slot)
+
+def img_tag(url, cls):
+    # 自带换行: 没有配图时整行省掉 (HTML 块里出现空行 Markdown 会把它截断)
+    return f'<img src="{url}" class="{cls}">\n' if url else ""
+
+# --- 3. 随机背景 ---
+@st.cache_resource
+def get_bg_candidates():
+    search_pattern = os.path.join(IMAGE_DIR_PATH, "imgi_*.jpg")
+    bg_candidates = glob.glob(search_pattern)
+    if not bg_candidates: 
+        bg_candidates = glob.glob(os.path.join(IMAGE_DIR_PATH, "*.jpg"))
+
+    specific_bgs = [
+        "ab67616d0000b2738e7e2c150cdfe189f7584fc4.jpg",
+        "ab67616d00001e0296094d0c80f0f321da705f88.jpg",
+        "c05ac5704cafd9d1242c0225e5c2ce67.1000x1000x1.png",
+        "c96f76385524a89fea9f1fa731113c6a.1000x1000x1.png",
+        "c1646624c824a8fadb6640002a43afe4.1000x1000x1.png",
+        "d2e07aab978bc9c5270a3113587205fe.1000x1000x1.png",
+        "e2da24f179bcc16641dac283bd5ad4e1.1000x1000x1.png",
+        "ab67616d00001e0207894829ab71aac2e995f425.jpg"
+    ]
+
+    for bg_file in specific_bgs:
+        full_path = os.path.join(IMAGE_DIR_PATH, bg_file)
+        if os.path.exists(full_path):
+            bg_candidates.append(full_path)
+    return bg_candidates
+
+bg_candidates = get_bg_candidates()
 if bg_candidates:
     if 'random_bg_path' not in st.session_state:
         st.session_state.random_bg_path = random.choice(bg_candidates)
-    bg_base64 = get_img_base64(os.path.basename(st.session_state.random_bg_path))
-else: bg_base64 = ""
+    bg_url = get_img_url(os.path.basename(st.session_state.random_bg_path), "bg")
+else: bg_url = ""
 
-# --- 5. 样式 (CSS) ---
-PRIMARY_COLOR = "#8B0000"
-SECONDARY_COLOR = "#FF6347"
-POSITIVE_COLOR = "#2E8B57"
-NEGATIVE_COLOR = "#B22222"
+# --- 4. 样式 (CSS) ---
+# 配色在 es_tracker.charts，与图表共用
 
 css_styles = f"""
 <style>
@@ -108,7 +69,7 @@ html, body, [class*="css"], .stApp, .stApp *, div, span, p, h1, h2, h3, h4, h5,
     font-family: 'Times New Roman', Times, serif !important;
 }}
 .stApp {{
-    background-image: linear-gradient(rgba(255, 255, 255, 0.25), rgba(255, 255, 255, 0.25)), url("{bg_base64}");
+    background-image: linear-gradient(rgba(255, 255, 255, 0.25), rgba(255, 255, 255, 0.25)), url("{bg_url}");
     background-repeat: repeat; 
     background-size: 33.333% auto; 
     background-position: top left;
@@ -298,297 +259,102 @@ table.custom-table td:nth-child(2) {{ font-weight: bold; }}
 """
 st.markdown(css_styles, unsafe_allow_html=True)
 
-# --- 6. 数据处理 ---
-HEADERS = {"User-Agent": "Mozilla/5.0"}
+# --- 5. 数据处理 ---
 if not os.path.exists(DATA_DIR_PATH): os.makedirs(DATA_DIR_PATH)
-
-@st.cache_data(ttl=3600)
-def get_kworb_data():
-    try:
-        r = requests.get("https://kworb.net/spotify/artist/66CXWjxzNUsdJxJ2JdwvnR_songs.html", headers=HEADERS, timeout=15)
-        r.encoding = 'utf-8'
-        dfs = pd.read_html(r.text)
-        for table in dfs:
-            if 'Song Title' in table.columns: return table
-    except: pass
-    return None
-
-def process_data_with_history():
-    raw_df = get_kworb_data()
-    if raw_df is None: return None
-
-    today_df = raw_df.rename(columns={'Song Title': 'Song'}).copy()
-    today_df['Song'] = today_df['Song'].apply(fix_encoding)
-    today_df['Streams_Num'] = today_df['Streams'].apply(clean_number)
-    today_df['Daily_Raw'] = today_df['Daily'].apply(clean_number)
-    today_df = today_df.groupby('Song', as_index=False).agg({'Streams_Num': 'max', 'Daily_Raw': 'max'})
-
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    today_file = os.path.join(DATA_DIR_PATH, f"{today_str}.csv")
-    today_df.to_csv(today_file, index=False)
-
-    all_files = sorted(glob.glob(os.path.join(DATA_DIR_PATH, "*.csv")))
-    history_files = [f for f in all_files if os.path.basename(f) != f"{today_str}.csv"]
-    prev_file = history_files[-1] if len(history_files) >= 1 else None
-    
-    merged = today_df.copy()
-    merged['Daily_Num'] = merged['Daily_Raw'] 
-    merged['Daily_Prev_Day'] = 0 
-    merged['Streams_Num_Prev'] = 0 
-    merged['Daily_Percent_Change'] = 0.0
-
-    if prev_file:
-        try:
-            prev_df = pd.read_csv(prev_file)
-            prev_df['Song'] = prev_df['Song'].apply(fix_encoding)
-            
-            if 'Daily_Raw' in prev_df.columns:
-                daily_prev_map = prev_df.set_index('Song')['Daily_Raw']
-                merged['Daily_Prev_Day'] = merged['Song'].map(daily_prev_map).fillna(0)
-            
-            prev_stream_map = prev_df.set_index('Song')['Streams_Num']
-            merged['Streams_Num_Prev'] = merged['Song'].map(prev_stream_map).fillna(0)
-            
-            merged['Daily_Calc'] = merged['Streams_Num'] - merged['Streams_Num_Prev']
-            
-            is_new = merged['Streams_Num_Prev'] == 0
-            merged['Daily_Num'] = merged['Daily_Calc']
-            merged.loc[is_new, 'Daily_Num'] = merged.loc[is_new, 'Daily_Raw']
-            
-            mask_fallback = (merged['Daily_Num'] <= 0) & (merged['Daily_Raw'] > 0)
-            merged.loc[mask_fallback, 'Daily_Num'] = merged.loc[mask_fallback, 'Daily_Raw']
-            
-            merged['Daily_Diff'] = merged['Daily_Num'] - merged['Daily_Prev_Day']
-            
-            valid_prev_daily = merged['Daily_Prev_Day'] > 0
-            merged.loc[valid_prev_daily, 'Daily_Percent_Change'] = (
-                merged['Daily_Diff'] / merged['Daily_Prev_Day'] * 100
-            )
-
-        except Exception as e:
-            st.error(f"Error reading history: {e}")
-
-    return merged
-
-# --- 7. 分类定义 ---
-STANDARD_EDITION_SET = {
-    "intro (end of the world)", "bye", "don't wanna break up again", "saturn returns interlude",
-    "eternal sunshine", "supernatural", "true story", "the boy is mine", "yes, and?",
-    "we can't be friends (wait for your love)", "i wish i hated you", "imperfect for you",
-    "ordinary things (feat. nonna)"
-}
-STREAMING_DELUXE_ADDITIONS = {
-    "intro (end of the world) - extended", "twilight zone", "warm", "dandelion", "past life", "hampstead"
-}
-STREAMING_DELUXE_SET = STANDARD_EDITION_SET.union(STREAMING_DELUXE_ADDITIONS)
-
-REMIXES_ON_CD = {
-    "yes, and? (with mariah carey) - remix", "supernatural (with troye sivan) - remix",
-    "the boy is mine (with brandy, monica) - remix"
-}
-OFFICIAL_DELUXE_CD_SET = STREAMING_DELUXE_SET.union(REMIXES_ON_CD)
-
-# 移除了 emoji
-def get_track_category(song_name):
-    s = song_name.lower().strip()
-    if s in OFFICIAL_DELUXE_CD_SET: return "Deluxe CD"
-    if "live" in s or "snl" in s: return "Live"
-    if "a cappella" in s: return "A Cappella"
-    if "instrumental" in s: return "Instrumental"
-    return "Other"
-
-def filter_and_categorize(df):
-    df_filtered = df[df['Song'].apply(is_relevant_track)].copy()
-    df_filtered['Category'] = df_filtered['Song'].apply(get_track_category)
-    df_filtered = df_filtered.drop_duplicates(subset=['Song'])
-
-    cat_order = {"Deluxe CD": 0, "Live": 1, "Other": 2, "A Cappella": 3, "Instrumental": 4}
-    df_filtered['Cat_Rank'] = df_filtered['Category'].map(cat_order).fillna(99)
-    df_filtered = df_filtered.sort_values(['Cat_Rank', 'Daily_Num'], ascending=[True, False]).reset_index(drop=True)
-    return df_filtered
-
-def calculate_set_stats_with_diff(df, target_set):
-    subset = df[df['Song'].str.lower().isin(target_set)]
-    streams = subset['Streams_Num'].sum()
-    daily = subset['Daily_Num'].sum()
-    daily_diff = subset['Daily_Diff'].sum()
-    count = len(subset)
-    return streams, daily, daily_diff, count
-
-# --- 8. 历史趋势数据生成 ---
-def get_historical_charts_data():
-    all_files = sorted(glob.glob(os.path.join(DATA_DIR_PATH, "*.csv")))
-    records_total = []
-    records_daily = []
-    song_history_list = []
-
-    for f in all_files:
-        date_str = os.path.basename(f).replace(".csv", "")
-        try:
-            df = pd.read_csv(f)
-            df['Song'] = df['Song'].apply(fix_encoding)
-            df['Song_Lower'] = df['Song'].str.lower().str.strip()
-            if 'Daily_Raw' in df.columns:
-                 df['Daily_Raw'] = df['Daily_Raw'].fillna(0).astype(int)
-            else:
-                 df['Daily_Raw'] = 0
-            if 'Streams_Num' not in df.columns:
-                 df['Streams_Num'] = df['Streams'].apply(clean_number)
-
-            df['is_valid'] = df['Song'].apply(is_relevant_track)
-            valid_tracks = df[df['is_valid']]
-            
-            for _, row in valid_tracks.iterrows():
-                song_history_list.append({
-                    "Date": date_str,
-                    "Song": row['Song'],
-                    "Streams": row['Streams_Num'],
-                    "Daily": row['Daily_Raw']
-                })
-
-            univ = valid_tracks
-            dlx = df[df['Song_Lower'].isin(OFFICIAL_DELUXE_CD_SET)]
-            std = df[df['Song_Lower'].isin(STANDARD_EDITION_SET)]
-            stm = df[df['Song_Lower'].isin(STREAMING_DELUXE_SET)]
-
-            records_total.append({
-                "Date": date_str,
-                "Official Deluxe CD": dlx['Streams_Num'].sum(),
-                "Standard Edition": std['Streams_Num'].sum(),
-                "Standard Deluxe Edition": stm['Streams_Num'].sum(), 
-                "Full Universe": univ['Streams_Num'].sum()
-            })
-
-            records_daily.append({
-                "Date": date_str,
-                "Official Deluxe CD": dlx['Daily_Raw'].sum(),
-                "Standard Edition": std['Daily_Raw'].sum(),
-                "Standard Deluxe Edition": stm['Daily_Raw'].sum(),
-                "Full Universe": univ['Daily_Raw'].sum()
-            })
-
-        except: pass
-
-    if not records_total: return None, None, None, None
-    
-    hist_total_df = pd.DataFrame(records_total)
-    hist_daily_df = pd.DataFrame(records_daily)
-    hist_songs_df = pd.DataFrame(song_history_list)
-    
-    # 7-Day Split Calculation
-    seven_day_stats = {}
-    cols = ["Official Deluxe CD", "Standard Edition", "Standard Deluxe Edition", "Full Universe"]
-    
-    if len(hist_total_df) >= 7:
-        row_now = hist_total_df.iloc[-1]
-        row_7d_ago = hist_total_df.iloc[-7]
-        for c in cols:
-            seven_day_stats[c] = row_now[c] - row_7d_ago[c]
-    elif len(hist_total_df) > 0:
-        row_now = hist_total_df.iloc[-1]
-        row_first = hist_total_df.iloc[0]
-        for c in cols:
-            seven_day_stats[c] = row_now[c] - row_first[c]
-    else:
-        for c in cols: seven_day_stats[c] = 0
-        
-    return hist_total_df, hist_daily_df, hist_songs_df, seven_day_stats
-
-# --- 9. 高级绘图函数 (Altair) ---
-def make_macro_chart(data, title, is_total=False):
-    melted = data.melt('Date', var_name='Version', value_name='Streams')
-    # 更新了 domain 以匹配无 emoji 的名称
-    domain_color = ['Official Deluxe CD', 'Standard Edition', 'Standard Deluxe Edition', 'Full Universe']
-    range_color = [PRIMARY_COLOR, SECONDARY_COLOR, POSITIVE_COLOR, '#000000']
-
-    y_scale = alt.Scale(zero=False, padding=0, nice=False)
-    y_axis = alt.Axis(title=None, format='.4s', labelExpr="replace(datum.label, 'G', 'B')")
-
-    if is_total:
-        y_scale = alt.Scale(zero=False, nice=False, padding=0.02)
-    
-    chart = alt.Chart(melted).mark_line(point=True, strokeWidth=3).encode(
-        x=alt.X('Date:T', axis=alt.Axis(format='%m-%d', title=None)),
-        y=alt.Y('Streams:Q', scale=y_scale, axis=y_axis),
-        color=alt.Color('Version:N', scale=alt.Scale(domain=domain_color, range=range_color), legend=alt.Legend(title=None, orient='top')),
-        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Version:N'), alt.Tooltip('Streams:Q', format=',')]
-    ).properties(height=350, title=title).interactive()
-
-    return chart
-
-def make_single_song_chart(data, song_name):
-    base = alt.Chart(data).encode(x=alt.X('Date:T', axis=alt.Axis(format='%m-%d', title=None)))
-    min_t = data['Streams'].min()
-    max_t = data['Streams'].max()
-    scale_total = alt.Scale(zero=False, nice=False, padding=0.05)
-    axis_total = alt.Axis(title='Total Streams', titleColor=PRIMARY_COLOR, labelExpr="replace(format(datum.value, '.2s'), 'G', 'B')")
-    
-    line_total = base.mark_line(color=PRIMARY_COLOR, strokeWidth=3).encode(
-        y=alt.Y('Streams:Q', scale=scale_total, axis=axis_total),
-        tooltip=[alt.Tooltip('Date:T'), alt.Tooltip('Streams:Q', format=',', title='Total')]
-    )
-    
-    scale_daily = alt.Scale(zero=False, nice=False, padding=0.05)
-    
-    line_daily = base.mark_line(color=POSITIVE_COLOR, strokeWidth=2, strokeDash=[5,5]).encode(
-        y=alt.Y('Daily:Q', scale=scale_daily, axis=alt.Axis(title='Daily Increase', titleColor=POSITIVE_COLOR, format=',.0f')),
-        tooltip=[alt.Tooltip('Date:T'), alt.Tooltip('Daily:Q', format=',', title='Daily')]
-    )
-    
-    chart = alt.layer(line_total, line_daily).resolve_scale(y='independent').properties(height=350, title=f"Trend: {song_name}").interactive()
-    return chart
-
-# --- 10. 主程序 UI ---
-with st.spinner("Processing Data..."):
-    full_df = process_data_with_history()
-    hist_total, hist_daily, hist_songs, seven_day_stats = get_historical_charts_data()
-
-if full_df is not None:
-    final_df = filter_and_categorize(full_df)
+# 首次运行时把旧版每日 CSV 迁移进按月分区的历史库
+with perf.stage("ensure_store"): store.ensure_store()
+
+# kworb 抓取在后台线程里进行，页面只读已提交的最新快照
+@st.cache_resource
+def get_ingest_worker():
+    return ingest.start_worker()
+
+def refresh_if_stale():
+    age = ingest.snapshot_age()
+    if age is None and store.latest_date() is None:
+        # 冷启动: 库里一天数据都没有，只能同步抓一次
+        ingest.refresh()
+    elif ingest.poll_due():
+        # 先展示旧快照，后台刷新完成后下一次重跑就能看到新数据 (查询时间按 kworb 的更新时刻排期)
+        get_ingest_worker().request_refresh()
+
+# --- 6. 分类 / 版本统计: 在 es_tracker.dashboard (页面和命令行报告共用) ---
+
+# --- 7. 历史趋势数据生成 ---
+# 聚合结果按天落盘 (es_tracker.history)，这里再按数据版本做进程内缓存:
+# 历史库没变时，切换下拉框等重跑不再重建任何历史表
+@perf.cached("historical_charts_data", st.cache_data(max_entries=4))
+def load_historical_charts_data(data_version):
+    return history.get_historical_charts_data()
+
+# 每首歌、每个版本的下一个里程碑，同样按数据版本缓存
+@perf.cached("milestone_forecasts", st.cache_data(max_entries=4))
+def load_milestone_forecasts(data_version):
+    hist_total, _, song_matrix, _ = load_historical_charts_data(data_version)
+    return forecast.forecast_milestones(hist_total, song_matrix)
+
+# 按歌索引的单曲历史: 只读共享对象，不像 cache_data 那样每次取出都复制一份
+@perf.cached("song_index", st.cache_resource(max_entries=4))
+def load_song_index(data_version):
+    return history.get_song_index()
+
+# --- 8. 高级绘图函数 (Altair): 在 es_tracker.charts (基准测试直接调用) ---
+
+# --- 9. 主程序 UI ---
+# 页面上的 HTML 片段和宏观图表的 Vega-Lite spec 按数据版本缓存，交互重跑时直接取出;
+# 页头时间戳不进缓存 (取出后替换占位符)，预计完成日期随日期参数每天失效
+TIMESTAMP_SLOT = "<!--timestamp-->"
+
+def get_diff_html(diff_val, current_daily):
+    yesterday_daily = current_daily - diff_val
+    pct_str = ""
+    if yesterday_daily > 0:
+        pct = (diff_val / yesterday_daily) * 100
+        pct_str = f"({pct:+.1f}%)"
+    elif yesterday_daily == 0 and diff_val != 0: pct_str = "(N/A)"
     
-    daily_active = final_df[final_df['Daily_Prev_Day'] > 0].copy()
+    # 移除了 emoji，仅保留文本符号
+    if diff_val > 0: return f'<span class="comp-badge comp-up">▲ {diff_val:,.0f} <span style="font-size:0.8em">{pct_str}</span></span>'
+    if diff_val < 0: return f'<span class="comp-badge comp-down">▼ {abs(diff_val):,.0f} <span style="font-size:0.8em">{pct_str}</span></span>'
+    return '<span class="comp-badge" style="color:#999">-</span>'
+
+@perf.cached("render_page", st.cache_data(max_entries=4, show_spinner=False))
+def render_page(data_version, today_str):
+    full_df = dashboard.load_latest_day()
+    if full_df is None: return None
+    hist_total, hist_daily, _, window_stats = load_historical_charts_data(data_version)
+    forecasts = load_milestone_forecasts(data_version)
+    # 最近 7 个日历日 (不是最近 7 行) 的增量
+    seven_day = (window_stats or {}).get(7)
+    seven_day_stats = seven_day["sums"] if seven_day and seven_day["days"] else {}
+    page = {}
+
+    final_df = dashboard.filter_and_categorize(full_df, tracks=store.read_aliases())
     
-    dlx_s, dlx_d, dlx_diff, dlx_c = calculate_set_stats_with_diff(final_df, OFFICIAL_DELUXE_CD_SET)
-    tot_s = final_df['Streams_Num'].sum()
-    tot_d = final_df['Daily_Num'].sum()
-    tot_diff = final_df['Daily_Diff'].sum()
-    tot_c = len(final_df)
-    std_s, std_d, std_diff, std_c = calculate_set_stats_with_diff(final_df, STANDARD_EDITION_SET)
-    stm_s, stm_d, stm_diff, stm_c = calculate_set_stats_with_diff(final_df, STREAMING_DELUXE_SET)
+    # 卡片都来自 editions.json: 第一个版本和专辑宇宙放在主卡片，其余版本各一张小卡片; 曲目数的分母是版本收录的曲目数
+    rules = DEFAULT_RULES
+    summary = dashboard.edition_summary(final_df)
+    featured, *sub_editions = rules.edition_sets
+    dlx_s, dlx_d, dlx_diff, dlx_c = summary[featured]
+    tot_s, tot_d, tot_diff, tot_c = summary[rules.universe]
+    top_3_gain, top_3_fall = dashboard.top_movers(final_df, 3)
     
     # 图像资源
-    img_hero_L = get_img_base64("ETERNALSUNSHINE.webp")
-    img_hero_R = get_img_base64("ETERNALSUNSHINEDELUXE.png")
-    img_sub_std = get_img_base64("d6718530158d6e809732743ecfd37adf_1000x.webp") 
-    img_sub_dlx = get_img_base64("lsjglsdD2C9_11.webp")
-
-    def get_diff_html(diff_val, current_daily):
-        yesterday_daily = current_daily - diff_val
-        pct_str = ""
-        if yesterday_daily > 0:
-            pct = (diff_val / yesterday_daily) * 100
-            pct_str = f"({pct:+.1f}%)"
-        elif yesterday_daily == 0 and diff_val != 0: pct_str = "(N/A)"
-        
-        # 移除了 emoji，仅保留文本符号
-        if diff_val > 0: return f'<span class="comp-badge comp-up">▲ {diff_val:,.0f} <span style="font-size:0.8em">{pct_str}</span></span>'
-        if diff_val < 0: return f'<span class="comp-badge comp-down">▼ {abs(diff_val):,.0f} <span style="font-size:0.8em">{pct_str}</span></span>'
-        return '<span class="comp-badge" style="color:#999">-</span>'
+    img_hero_L = get_img_url(rules.images[featured], "hero")
+    img_hero_R = get_img_url(rules.images[rules.universe], "hero")
 
     diff_html_dlx = get_diff_html(dlx_diff, dlx_d)
     diff_html_tot = get_diff_html(tot_diff, tot_d)
 
     # --- Hero Card ---
     # 添加了 Timestamp
-    current_time_str = datetime.now().strftime("%B %d, %Y | %H:%M")
-    st.markdown(f'''<div class="hero-card">
+    page["hero"] = f'''<div class="hero-card">
 <div class="hero-title">Eternal Sunshine Tracker</div>
-<div class="hero-timestamp">{current_time_str}</div>
+<div class="hero-timestamp">{TIMESTAMP_SLOT}</div>
 <div class="hero-flex-container">
 <div class="hero-side">
-<img src="{img_hero_L}" class="hero-img">
-<div class="hero-data">
-<div class="hero-sub-title">Official Deluxe CD</div>
+{img_tag(img_hero_L, "hero-img")}<div class="hero-data">
+<div class="hero-sub-title">{featured}</div>
 <div class="hero-label">Total Streams</div>
 <div class="hero-val-big">{dlx_s:,.0f}</div>
 <div class="hero-label">Daily Increase</div>
@@ -596,13 +362,13 @@ if full_df is not None:
 <div class="hero-val-daily">+{dlx_d:,.0f}</div>
 <div>{diff_html_dlx}</div>
 </div>
-<div class="sub-metric">Tracks: {dlx_c} / 22</div>
+<div class="sub-metric">Tracks: {dlx_c} / {len(rules.edition_sets[featured])}</div>
 </div>
 </div>
 <div class="hero-divider"></div>
 <div class="hero-side">
 <div class="hero-data">
-<div class="hero-sub-title">Full Universe (All Versions)</div>
+<div class="hero-sub-title">{rules.universe} (All Versions)</div>
 <div class="hero-label">Total Streams</div>
 <div class="hero-val-big">{tot_s:,.0f}</div>
 <div class="hero-label">Daily Increase</div>
@@ -612,52 +378,33 @@ if full_df is not None:
 </div>
 <div class="sub-metric">Total Tracks: {tot_c}</div>
 </div>
-<img src="{img_hero_R}" class="hero-img">
-</div>
+{img_tag(img_hero_R, "hero-img")}</div>
 </div>
-</div>''', unsafe_allow_html=True)
+</div>'''
 
     # --- Sub Cards ---
-    c1, c2 = st.columns(2)
-    with c1:
-        diff_html_std = get_diff_html(std_diff, std_d)
-        st.markdown(f'''<div class="sub-card-flex">
-<img src="{img_sub_std}" class="sub-card-img">
-<div class="sub-card-data">
-<div class="metric-title">Standard Edition</div>
+    # 两张一行，配图左右交替
+    page["sub_cards"] = []
+    for i, name in enumerate(sub_editions):
+        e_s, e_d, e_diff, e_c = summary[name]
+        img_html = img_tag(get_img_url(rules.images[name], "sub"), "sub-card-img")
+        page["sub_cards"].append(f'''<div class="sub-card-flex">
+{img_html if i % 2 == 0 else ""}<div class="sub-card-data">
+<div class="metric-title">{name}</div>
 <div class="metric-label">Total Streams</div>
-<div class="metric-value-small">{std_s:,.0f}</div>
+<div class="metric-value-small">{e_s:,.0f}</div>
 <div class="metric-label" style="margin-top:5px;">Daily</div>
 <div class="flex-metric-row">
-<div class="metric-value-small" style="font-size: 20px; color: #2E8B57;">+{std_d:,.0f}</div>
-<div>{diff_html_std}</div>
+<div class="metric-value-small" style="font-size: 20px; color: #2E8B57;">+{e_d:,.0f}</div>
+<div>{get_diff_html(e_diff, e_d)}</div>
 </div>
-<div class="sub-metric">Tracks: {std_c} / 13</div>
+<div class="sub-metric">Tracks: {e_c} / {len(rules.edition_sets[name])}</div>
 </div>
-</div>''', unsafe_allow_html=True)
-    with c2:
-        diff_html_stm = get_diff_html(stm_diff, stm_d)
-        st.markdown(f'''<div class="sub-card-flex">
-<div class="sub-card-data">
-<div class="metric-title">Standard Deluxe Edition</div>
-<div class="metric-label">Total Streams</div>
-<div class="metric-value-small">{stm_s:,.0f}</div>
-<div class="metric-label" style="margin-top:5px;">Daily</div>
-<div class="flex-metric-row">
-<div class="metric-value-small" style="font-size: 20px; color: #2E8B57;">+{stm_d:,.0f}</div>
-<div>{diff_html_stm}</div>
-</div>
-<div class="sub-metric">Tracks: {stm_c} / 19</div>
-</div>
-<img src="{img_sub_dlx}" class="sub-card-img">
-</div>''', unsafe_allow_html=True)
-
-    st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
+{img_html if i % 2 == 1 else ""}</div>''')
 
     # --- Highlight Strip (No Emojis) ---
     gain_html = ""
-    if not daily_active.empty:
-        top_3_gain = daily_active.nlargest(3, 'Daily_Percent_Change')
+    if not top_3_gain.empty:
         for idx, row in top_3_gain.iterrows():
             song_name = row['Song']
             daily_inc = row['Daily_Num']
@@ -665,8 +412,7 @@ if full_df is not None:
     else: gain_html = "<div class='mover-row'>No Data</div>"
 
     fall_html = ""
-    if not daily_active.empty:
-        top_3_fall = daily_active.nsmallest(3, 'Daily_Percent_Change')
+    if not top_3_fall.empty:
         for idx, row in top_3_fall.iterrows():
             song_name = row['Song']
             val = row['Daily_Percent_Change']
@@ -679,21 +425,15 @@ if full_df is not None:
     else: fall_html = "<div class='mover-row'>No Data</div>"
 
     if seven_day_stats:
-        s7_uni = seven_day_stats.get("Full Universe", 0)
-        s7_dlx = seven_day_stats.get("Official Deluxe CD", 0)
-        s7_std = seven_day_stats.get("Standard Edition", 0)
-        s7_stm = seven_day_stats.get("Standard Deluxe Edition", 0)
-        
-        stats_html = f'''
-<div class="stat-box"><div class="stat-label">Full Universe</div><div class="stat-val">+{s7_uni:,.0f}</div></div>
-<div class="stat-box"><div class="stat-label">Official Deluxe</div><div class="stat-val">+{s7_dlx:,.0f}</div></div>
-<div class="stat-box"><div class="stat-label">Standard Ed.</div><div class="stat-val">+{s7_std:,.0f}</div></div>
-<div class="stat-box"><div class="stat-label">Std. Deluxe</div><div class="stat-val">+{s7_stm:,.0f}</div></div>
-'''
+        # 专辑宇宙在前，之后按 editions.json 的顺序
+        stats_html = "\n" + "".join(
+            f'<div class="stat-box"><div class="stat-label">{rules.labels[name]}</div><div class="stat-val">+{seven_day_stats.get(name, 0):,.0f}</div></div>\n'
+            for name in [rules.universe, *rules.edition_sets]
+        )
     else: stats_html = "<div>Not enough history</div>"
 
     # 移除了标题中的 emoji
-    st.markdown(f'''<div class="highlight-strip">
+    page["highlights"] = f'''<div class="highlight-strip">
 <div class="highlight-left">
 <div style="display:flex; gap:30px; flex-wrap:wrap;">
 <div class="mover-col">
@@ -713,7 +453,7 @@ if full_df is not None:
 {stats_html}
 </div>
 </div>
-</div>''', unsafe_allow_html=True)
+</div>'''
 
     # --- Milestone Tracker (Replaced Tier List) ---
     # 逻辑: 如果现在是 65亿，目标是 70亿。如果已经 71亿，目标是 80亿。
@@ -725,19 +465,27 @@ if full_df is not None:
     target_streams = target_billion * 1_000_000_000
     remaining_streams = target_streams - tot_s
     
-    # 预测日期
+    # 预测日期: 优先用 Full Universe 拟合出的衰减趋势，历史不够时退回 7 天平均
     seven_day_uni_gain = seven_day_stats.get("Full Universe", 0)
-    avg_daily_gain = seven_day_uni_gain / 7 if seven_day_uni_gain > 0 else 0
-    
-    if avg_daily_gain > 0:
+    avg_daily_gain = seven_day_uni_gain / seven_day["days"] if seven_day_uni_gain > 0 else 0
+    uni_fit = forecasts[(forecasts['Kind'] == "edition") & (forecasts['Name'] == "Full Universe")]
+
+    days_to_go = None
+    if not uni_fit.empty and uni_fit['Daily_Rate'].iloc[0] > 0:
+        days_to_go = float(forecast.days_to_reach(remaining_streams, uni_fit['Daily_Rate'].iloc[0], uni_fit['Decay'].iloc[0]))
+    elif avg_daily_gain > 0:
         days_to_go = remaining_streams / avg_daily_gain
+
+    if days_to_go is not None and days_to_go < 36500:
         estimated_date = datetime.now() + timedelta(days=days_to_go)
         date_display = estimated_date.strftime("%B %d, %Y")
+    elif days_to_go is not None:
+        date_display = "Not on current trend"
     else:
         date_display = "Indefinite (Need more data)"
 
     # --- 修改部分开始 (Modified Milestone UI) ---
-    st.markdown(f'''<div class="content-block" style="margin-bottom: 20px;">
+    page["milestone"] = f'''<div class="content-block" style="margin-bottom: 20px;">
 <div class="milestone-box">
 <div class="milestone-title">
     ROAD TO <span style="font-size: 1.6em; margin: 0 6px;">{target_billion} BILLION</span> STREAMS
@@ -749,9 +497,21 @@ if full_df is not None:
 </div>
 <a href="https://open.spotify.com/album/6cbwstHlsAIIWurIIXXBPd，写上" target="_blank" class="spotify-btn">KEEP STREAMING!!</a>
 </div>
-</div>''', unsafe_allow_html=True)
+</div>'''
     # --- 修改部分结束 ---
 
+    # --- 全部里程碑预测 ---
+    page["forecasts"] = None
+    if not forecasts.empty:
+        fc_df = forecasts.copy()
+        fc_df['Next Milestone'] = fc_df['Milestone'].apply(forecast.format_milestone)
+        fc_df['Remaining'] = fc_df['Remaining'].apply(lambda x: f"{x:,.0f}")
+        fc_df['Daily Now'] = fc_df['Daily_Rate'].apply(lambda x: f"+{x:,.0f}")
+        fc_df['Estimated Date'] = fc_df['ETA'].fillna("Not on current trend")
+        fc_df['Kind'] = fc_df['Kind'].str.title()
+        fc_df = fc_df[['Name', 'Kind', 'Next Milestone', 'Remaining', 'Daily Now', 'Estimated Date']]
+        fc_html = fc_df.to_html(classes='custom-table', index=False, escape=True)
+        page["forecasts"] = f'<div class="table-scroll">{fc_html}</div>'
 
     # --- List ---
     if tot_d > 0:
@@ -781,12 +541,87 @@ if full_df is not None:
     table_html = display_df.to_html(classes='custom-table', index=False, escape=True)
     table_html = table_html.replace("▲", f"<span style='color:{POSITIVE_COLOR}; font-weight:bold'>▲").replace("▼", f"<span style='color:{NEGATIVE_COLOR}; font-weight:bold'>▼")
     
-    st.markdown(f'''<div class="content-block"><div class="card-internal-header">Detailed Track List</div><div class="table-scroll">{table_html}</div></div>''', unsafe_allow_html=True)
+    page["track_table"] = f'''<div class="content-block"><div class="card-internal-header">Detailed Track List</div><div class="table-scroll">{table_html}</div></div>'''
+
+    # --- Charts ---
+    page["has_history"] = hist_total is not None and not hist_total.empty
+    page["song_list"] = []
+    page["default_song_idx"] = 0
+    song_index = load_song_index(data_version)
+    page["song_list"] = song_index.names
+    default_song = song_index.find("we can't be friends")
+    if default_song: page["default_song_idx"] = song_index.names.index(default_song)
+    return page
+
+# 图表时间跨度: 跨度越长分辨率越粗 (日 -> 周 -> 月)，每条线的点数有上限，spec 大小不随历史长度增长
+CHART_RANGES = {"1M": 31, "3M": 92, "1Y": 366, "All": None}
+RESOLUTION_NOTES = {"W": "Weekly: last total / average daily increase per week", "M": "Monthly: last total / average daily increase per month"}
+
+@perf.cached("macro_chart_specs", st.cache_data(max_entries=8, show_spinner=False))
+def get_macro_chart_specs(data_version, range_key):
+    total, daily, resolution = history.get_chart_tables(CHART_RANGES[range_key])
+    return charts.chart_spec(charts.make_macro_chart(total, "", is_total=True)), charts.chart_spec(charts.make_macro_chart(daily, "", is_total=False)), resolution
+
+@perf.cached("song_chart_spec", st.cache_data(max_entries=64, show_spinner=False))
+def get_song_chart_spec(data_version, song_name, range_key):
+    song_data, _ = history.song_chart_table(load_song_index(data_version).get(song_name), CHART_RANGES[range_key])
+    if song_data.empty: return None
+    return charts.chart_spec(charts.make_single_song_chart(song_data, song_name))
+
+@perf.cached("compare_chart_specs", st.cache_data(max_entries=16, show_spinner=False))
+def get_compare_chart_specs(data_version, song_names, range_key):
+    song_index = load_song_index(data_version)
+    parts = [history.song_chart_table(song_index.get(s), CHART_RANGES[range_key])[0] for s in song_names]
+    parts = [p for p in parts if not p.empty]
+    if not parts: return None
+    songs_data = pd.concat(parts, ignore_index=True)
+    return (charts.chart_spec(charts.make_songs_compare_chart(songs_data, 'Streams', "Total Streams")),
+            charts.chart_spec(charts.make_songs_compare_chart(songs_data, 'Daily', "Daily Increase")))
+
+# 切换歌曲只重跑这一块
+@st.fragment
+def single_track_analyzer(data_version, song_list, default_idx, range_key):
+    selected_song = st.selectbox("Select a song to track:", song_list, index=default_idx)
+    compare_with = st.multiselect("Compare with:", [s for s in song_list if s != selected_song])
+    if compare_with:
+        specs = get_compare_chart_specs(data_version, tuple([selected_song] + compare_with), range_key)
+        if specs is not None:
+            tab_total, tab_daily = st.tabs(["Total Streams", "Daily Increase"])
+            with tab_total: st.vega_lite_chart(spec=specs[0], use_container_width=True)
+            with tab_daily: st.vega_lite_chart(spec=specs[1], use_container_width=True)
+        return
+    spec = get_song_chart_spec(data_version, selected_song, range_key)
+    if spec is not None:
+        st.vega_lite_chart(spec=spec, use_container_width=True)
+
+with st.spinner("Processing Data..."):
+    with perf.stage("ingest_check"):
+        get_ingest_worker()
+        refresh_if_stale()
+    data_version = history.store_version()
+    page = render_page(data_version, datetime.now().strftime("%Y-%m-%d"))
+
+if page is not None:
+    current_time_str = datetime.now().strftime("%B %d, %Y | %H:%M")
+    st.markdown(page["hero"].replace(TIMESTAMP_SLOT, current_time_str), unsafe_allow_html=True)
+
+    for i in range(0, len(page["sub_cards"]), 2):
+        for col, card in zip(st.columns(2), page["sub_cards"][i:i + 2]):
+            with col: st.markdown(card, unsafe_allow_html=True)
+
+    st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
+    st.markdown(page["highlights"], unsafe_allow_html=True)
+    st.markdown(page["milestone"], unsafe_allow_html=True)
+    if page["forecasts"]:
+        with st.expander("Upcoming Milestones: every track & edition"):
+            st.markdown(page["forecasts"], unsafe_allow_html=True)
+
+    st.markdown(page["track_table"], unsafe_allow_html=True)
 
     st.markdown('<div class="section-gap"></div>', unsafe_allow_html=True)
 
     # --- Charts ---
-    if hist_total is not None and not hist_total.empty:
+    if page["has_history"]:
         st.markdown(f'''<div class="content-block" style="padding-bottom: 0px; border-bottom: none; border-bottom-left-radius: 0; border-bottom-right-radius: 0;">
 <div class="card-internal-header">Historical Trends</div>
 </div>''', unsafe_allow_html=True)
@@ -801,32 +636,23 @@ div[data-testid="stVerticalBlock"] > div:has(div[class*="content-block"]) + div
 }
 </style>""", unsafe_allow_html=True)
              
+             range_key = st.radio("Time range", list(CHART_RANGES), index=len(CHART_RANGES) - 1, horizontal=True, key="chart_range")
+             spec_total, spec_daily, resolution = get_macro_chart_specs(data_version, range_key)
              col_L, col_R = st.columns([3, 2], gap="large")
              
              with col_L:
                  st.markdown("##### Album Versions Overview") # Removed Emoji
+                 if resolution in RESOLUTION_NOTES: st.caption(RESOLUTION_NOTES[resolution])
                  tab1, tab2 = st.tabs(["Total Streams", "Daily Increase"])
                  with tab1:
-                    c_total = make_macro_chart(hist_total, "", is_total=True)
-                    st.altair_chart(c_total, use_container_width=True)
+                    st.vega_lite_chart(spec=spec_total, use_container_width=True)
                  with tab2:
-                    c_daily = make_macro_chart(hist_daily, "", is_total=False)
-                    st.altair_chart(c_daily, use_container_width=True)
+                    st.vega_lite_chart(spec=spec_daily, use_container_width=True)
             
              with col_R:
                  st.markdown("##### Single Track Analyzer") # Removed Emoji
-                 if hist_songs is not None and not hist_songs.empty:
-                     song_list = sorted(hist_songs['Song'].unique())
-                     default_idx = 0
-                     for i, s in enumerate(song_list):
-                         if "we can't be friends" in s.lower(): 
-                             default_idx = i
-                             break
-                     selected_song = st.selectbox("Select a song to track:", song_list, index=default_idx)
-                     song_data = hist_songs[hist_songs['Song'] == selected_song].copy()
-                     if not song_data.empty:
-                         c_song = make_single_song_chart(song_data, selected_song)
-                         st.altair_chart(c_song, use_container_width=True)
+                 if page["song_list"]:
+                     single_track_analyzer(data_version, page["song_list"], page["default_song_idx"], range_key)
                  else:
                      st.write("No song data available.")
     else:
@@ -836,3 +662,13 @@ div[data-testid="stVerticalBlock"] > div:has(div[class*="content-block"]) + div
     st.markdown('<div class="footer">唐可可的小炸弹 with gemini/ ig:sampoohh/ email: sheepYeoh@outlook.com</div>', unsafe_allow_html=True)
 else:
     st.error("Connection failed. Unable to reach Kworb.")
+
+# --- 10. 性能面板 (隐藏) ---
+# 进程累计指标写成 Prometheus 文本 (es_data/cache/metrics.prom); 每轮重跑都调用，但最多每分钟落盘一次
+perf.end_run(perf_run)
+perf.write_textfile()
+if st.query_params.get("debug") == "perf":
+    with st.expander("Performance: this rerun", expanded=True):
+        st.code(perf.format_run(perf_run), language=None)
+        st.caption("Process totals (Prometheus text format)")
+        st.code(perf.prometheus_text(), language=None)
@@ -0,0 +1,13 @@
+# ES Deluxe Tracker 数据层 (不依赖 Streamlit)
+# 子模块按需加载: `import es_tracker` 本身不引入 pandas/pyarrow/requests，
+# 第一次访问 es_tracker.history 之类的属性时才导入对应模块
+import importlib
+
+SUBMODULES = (
+    "api", "assets", "catalog", "charts", "classify", "config", "dashboard", "editions", "fetch", "forecast",
+    "history", "ingest", "kworb", "metrics", "perf", "replay", "series", "shared_cache", "store", "utils",
+)
+
+def __getattr__(name):
+    if name in SUBMODULES: return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
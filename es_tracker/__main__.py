@@ -0,0 +1,141 @@
+import sys
+import json
+import argparse
+
+# --- 无界面命令行 (cron 用) ---
+#   python -m es_tracker ingest [--entity ID]   抓一次 kworb 并入库
+#   python -m es_tracker recompute [--start D]  重算派生列
+#   python -m es_tracker report [--json]        打印最新一天的版本统计 (--entity 换成别的追踪对象)
+#   python -m es_tracker replay [--workers N]   用当前规则重放整个历史库
+#   python -m es_tracker import-pages FILE...   用存档的 kworb 页面补缺的日子
+#   python -m es_tracker api [--port N]         只读 JSON/Arrow HTTP API
+# 每个子命令只导入自己用到的模块: ingest 不会加载历史聚合、预测和图表相关的代码
+
+def cmd_ingest(args):
+    from . import catalog, ingest, store
+    store.ensure_store()
+    entities = [catalog.get_entity(i) for i in args.entity] if args.entity else None
+    date_str = ingest.refresh(entities=entities, force=True)
+    print(f"ingested {date_str}" if date_str else "fetch failed")
+    return 0 if date_str else 1
+
+def cmd_recompute(args):
+    from . import store
+    from .config import STORE_DIR_PATH
+    store.ensure_store()
+    with store.writer_lock(): written = store.recompute(start=args.start)
+    print(f"recomputed {len(written)} changed day(s) in {STORE_DIR_PATH}")
+    return 0
+
+def _store_dir(entity_id):
+    from . import catalog
+    return catalog.entity_store_dir(catalog.get_entity(entity_id))
+
+def cmd_replay(args):
+    from . import replay, store
+    # 和抓取入库、别的副本上的命令互斥 (store.writer_lock)
+    with store.writer_lock(): n_days, seconds = replay.replay(_store_dir(args.entity), workers=args.workers, output=args.output)
+    print(f"replayed {n_days} day(s) in {seconds:.2f} s ({n_days / max(seconds, 1e-9):.1f} days/s)"
+          + (f" into {args.output}" if args.output else ""))
+    return 0
+
+def cmd_import_pages(args):
+    from . import replay, store
+    with store.writer_lock(): imported = replay.import_pages(args.paths, _store_dir(args.entity), overwrite=args.overwrite, workers=args.workers)
+    print(f"imported {len(imported)} day(s)" + (f": {', '.join(imported)}" if imported else ""))
+    return 0
+
+def cmd_api(args):
+    from . import api
+    api.serve(args.host, args.port)
+    return 0
+
+def build_report(milestones=5, entity_id=None):
+    from . import catalog, dashboard, forecast, history, store
+    entity = catalog.get_entity(entity_id)
+    store_dir, rules = catalog.entity_store_dir(entity), catalog.entity_rules(entity)
+    full_df = dashboard.load_latest_day(store_dir)
+    if full_df is None: return None
+    final_df = dashboard.filter_and_categorize(full_df, rules, store.read_aliases(store_dir))
+    hist_total, _, song_matrix, window_stats = history.get_historical_charts_data(store_dir, catalog.entity_cache_path(entity), rules)
+    gainers, fallers = dashboard.top_movers(final_df, 3)
+    forecasts = forecast.forecast_milestones(hist_total, song_matrix)
+    seven_day = (window_stats or {}).get(7) or {"days": 0, "sums": {}}
+
+    def movers(df):
+        return [{"song": r.Song, "daily": int(r.Daily_Num), "pct": round(float(r.Daily_Percent_Change), 1)} for r in df.itertuples()]
+
+    return {
+        "entity": entity["id"],
+        "title": entity["title"],
+        "date": store.latest_date(store_dir=store_dir),
+        "editions": {name: {"streams": int(s), "daily": int(d), "daily_diff": int(diff), "tracks": int(c)}
+                     for name, (s, d, diff, c) in dashboard.edition_summary(final_df, rules).items()},
+        "past_days": {"days": seven_day["days"], "increase": {k: round(v) for k, v in seven_day["sums"].items()}},
+        "gainers": movers(gainers),
+        "fallers": movers(fallers),
+        "milestones": [{"name": r.Name, "kind": r.Kind, "milestone": int(r.Milestone), "eta": r.ETA}
+                       for r in forecasts[forecasts["ETA"].notna()].head(milestones).itertuples()],
+    }
+
+def format_report(report):
+    lines = [f"{report['title']} Tracker - {report['date']}", ""]
+    lines.append(f"{'Edition':<26}{'Total Streams':>16}{'Daily':>14}{'Vs Yesterday':>14}{'Tracks':>8}")
+    for name, e in report["editions"].items():
+        lines.append(f"{name:<26}{e['streams']:>16,}{e['daily']:>+14,}{e['daily_diff']:>+14,}{e['tracks']:>8}")
+    lines += ["", f"Past {report['past_days']['days']} days increase:"]
+    lines += [f"  {name:<24}{v:>+16,}" for name, v in report["past_days"]["increase"].items()]
+    for label, key in (("Top gainers", "gainers"), ("Top fallers", "fallers")):
+        lines += ["", f"{label}:"]
+        lines += [f"  {m['song']:<48}{m['daily']:>+12,}  ({m['pct']:+.1f}%)" for m in report[key]] or ["  No Data"]
+    lines += ["", "Next milestones:"]
+    lines += [f"  {m['name']:<48}{m['milestone']:>16,}  {m['eta']}" for m in report["milestones"]] or ["  None on current trend"]
+    return "\n".join(lines)
+
+def cmd_report(args):
+    from . import store
+    store.ensure_store()
+    report = build_report(args.milestones, args.entity)
+    if report is None:
+        print("history store is empty", file=sys.stderr)
+        return 1
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m es_tracker", description="ES Tracker headless commands")
+    parser.add_argument("--timings", action="store_true", help="print a per-stage timing breakdown to stderr")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_ing = sub.add_parser("ingest", help="fetch kworb once and write today's snapshot")
+    p_ing.add_argument("--entity", action="append", help="only fetch these catalog ids")
+    p_rec = sub.add_parser("recompute", help="recompute derived daily metrics for stored days")
+    p_rec.add_argument("--start", help="first date to recompute (YYYY-MM-DD), default: all days")
+    p_rep = sub.add_parser("report", help="print the latest day's edition stats, movers and milestones")
+    p_rep.add_argument("--json", action="store_true", help="machine-readable output")
+    p_rep.add_argument("--milestones", type=int, default=5, help="how many upcoming milestones to list")
+    p_rep.add_argument("--entity", help="catalog id (default: the dashboard's)")
+    p_rpl = sub.add_parser("replay", help="re-derive every stored day through the current pipeline into a new history version")
+    p_rpl.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    p_rpl.add_argument("--output", help="write the new version here instead of replacing the store")
+    p_rpl.add_argument("--entity", help="catalog id (default: the dashboard's)")
+    p_imp = sub.add_parser("import-pages", help="fill missing days from archived kworb HTML pages (date in file name)")
+    p_imp.add_argument("paths", nargs="+")
+    p_imp.add_argument("--overwrite", action="store_true", help="also replace days already in the store")
+    p_imp.add_argument("--workers", type=int, help="worker processes for parsing (default: one per CPU)")
+    p_imp.add_argument("--entity", help="catalog id (default: the dashboard's)")
+    p_api = sub.add_parser("api", help="serve the read-only JSON/Arrow API")
+    p_api.add_argument("--host", default="127.0.0.1")
+    p_api.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args(argv)
+    handler = {
+        "ingest": cmd_ingest, "recompute": cmd_recompute, "report": cmd_report,
+        "replay": cmd_replay, "import-pages": cmd_import_pages, "api": cmd_api,
+    }[args.cmd]
+    if not args.timings: return handler(args)
+    from . import perf
+    with perf.run() as r: code = handler(args)
+    print(perf.format_run(r), file=sys.stderr)
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import json
+import time
+import hashlib
+import functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+import pyarrow as pa
+
+from . import catalog, dashboard, history, ingest, perf, store
+from .series import WINDOWS
+
+# --- 只读 HTTP API ---
+# 给机器人 / 小组件用，数据和页面同源 (历史库 + 落盘的历史聚合)，不用跑整个页面脚本:
+#   GET /api/songs                最新一天的曲目表 (页面上的 Detailed Track List)
+#   GET /api/editions             各版本的总播放 / 日增量 / 较昨日变化 / 曲目数 (页面顶部的卡片)
+#   GET /api/history?song=NAME    单曲每天的累计播放和日增量
+#   GET /api/stats?days=7         最近 N 个日历日各版本的增量 (N 取 7/28/90)
+# 每个端点都可以带 ?entity=ID 换成 catalog.json 里的别的追踪对象 (默认是仪表盘展示的那个)。
+# 默认返回 JSON; ?format=arrow 或 Accept: application/vnd.apache.arrow.stream 时返回 Arrow IPC 流。
+# 响应体按 (数据版本, 端点, 参数, 格式) 缓存在进程里，ETag 是这个键的哈希: 数据没变时重复请求只是查表，
+# 带 If-None-Match 时回 304; Cache-Control 的 max-age 到下一次该查询 kworb 为止
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+JSON_TYPE = "application/json; charset=utf-8"
+MIN_MAX_AGE = 60
+RESPONSE_CACHE_SIZE = 256
+
+SONG_COLUMNS = ["Song", "Category", "Streams_Num", "Daily_Num", "Daily_Prev_Day", "Daily_Diff", "Daily_Percent_Change"]
+
+class NotFound(KeyError):
+    pass
+
+def entity_of(params):
+    # -> (对象, 历史库目录, 聚合缓存路径, 版本定义)
+    try: entity = catalog.get_entity(params.get("entity"))
+    except KeyError: raise NotFound(f"unknown entity: {params['entity']}")
+    return entity, catalog.entity_store_dir(entity), catalog.entity_cache_path(entity), catalog.entity_rules(entity)
+
+def _latest_songs(params):
+    _, store_dir, _, rules = entity_of(params)
+    full_df = dashboard.load_latest_day(store_dir)
+    if full_df is None: raise NotFound("history store is empty")
+    return dashboard.filter_and_categorize(full_df, rules, store.read_aliases(store_dir))
+
+def songs_table(params):
+    return _latest_songs(params)[SONG_COLUMNS]
+
+def editions_table(params):
+    summary = dashboard.edition_summary(_latest_songs(params), entity_of(params)[3])
+    return pd.DataFrame(
+        [(name, int(s), int(d), int(diff), int(c)) for name, (s, d, diff, c) in summary.items()],
+        columns=["Edition", "Streams", "Daily", "Daily_Diff", "Tracks"],
+    )
+
+def history_table(params):
+    song = params.get("song")
+    if not song: raise ValueError("missing ?song=")
+    index = history.get_song_index(*entity_of(params)[1:])
+    if song not in index: raise NotFound(f"unknown song: {song}")
+    return index.get(song)
+
+def stats_table(params):
+    days = params.get("days", "7")
+    if days not in [str(w) for w in WINDOWS]: raise ValueError(f"days must be one of {', '.join(map(str, WINDOWS))}")
+    days = int(days)
+    _, _, _, window_stats = history.get_historical_charts_data(*entity_of(params)[1:])
+    if window_stats is None: raise NotFound("history store is empty")
+    stats = window_stats[days]
+    return pd.DataFrame(
+        [(name, days, stats["days"], round(v)) for name, v in stats["sums"].items()],
+        columns=["Edition", "Window", "Days", "Increase"],
+    )
+
+ENDPOINTS = {
+    "/api/songs": songs_table,
+    "/api/editions": editions_table,
+    "/api/history": history_table,
+    "/api/stats": stats_table,
+}
+
+# --- 编码 + 缓存 ---
+def encode(df, date_str, fmt):
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata({"date": date_str or ""})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer: writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_TYPE
+    rows = json.loads(df.to_json(orient="records", force_ascii=False))
+    return json.dumps({"date": date_str, "rows": rows}, ensure_ascii=False).encode("utf-8"), JSON_TYPE
+
+@perf.cached("api_response", functools.lru_cache(maxsize=RESPONSE_CACHE_SIZE))
+def render(data_version, path, params, fmt):
+    # params 是排好序的 ((键, 值), ...)，好当缓存键; 返回 (ETag, Content-Type, 响应体)
+    df = ENDPOINTS[path](dict(params))
+    body, content_type = encode(df, store.latest_date(store_dir=entity_of(dict(params))[1]), fmt)
+    etag = '"' + hashlib.sha1(repr((data_version, path, params, fmt)).encode()).hexdigest()[:20] + '"'
+    return etag, content_type, body
+
+def max_age():
+    return max(int(ingest.poll_due_at() - time.time()), MIN_MAX_AGE)
+
+# --- 服务 ---
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "es-tracker-api"
+
+    def _send(self, status, body=b"", content_type=JSON_TYPE, headers=(), head=False):
+        self.send_response(status)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for k, v in headers: self.send_header(k, v)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and not head and status != 304: self.wfile.write(body)
+
+    def _error(self, status, message, head):
+        self._send(status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"), head=head)
+
+    def do_GET(self, head=False):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        if path not in ENDPOINTS: return self._error(404, f"unknown endpoint: {url.path}", head)
+        params = dict(parse_qsl(url.query))
+        fmt = params.pop("format", None) or ("arrow" if ARROW_TYPE in self.headers.get("Accept", "") else "json")
+        if fmt not in ("json", "arrow"): return self._error(400, "format must be json or arrow", head)
+        with perf.stage("api_request"):
+            try:
+                _, store_dir, _, rules = entity_of(params)
+                etag, content_type, body = render(history.store_version(store_dir, rules), path, tuple(sorted(params.items())), fmt)
+            except NotFound as e: return self._error(404, e.args[0], head)
+            except ValueError as e: return self._error(400, str(e), head)
+        headers = [("ETag", etag), ("Cache-Control", f"public, max-age={max_age()}"), ("Vary", "Accept")]
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            perf.count("api_not_modified")
+            return self._send(304, headers=headers, head=head)
+        self._send(200, body, content_type, headers, head)
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def log_message(self, *args):
+        pass
+
+def serve(host="127.0.0.1", port=8600):
+    store.ensure_store()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    print(f"serving read-only API on http://{host}:{server.server_port}/api/")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: server.server_close()
@@ -0,0 +1,111 @@
+import os
+import io
+import hashlib
+import argparse
+import threading
+
+from .config import ROOT_DIR
+
+# --- 图片资源流水线 ---
+# 原图 (esimages/, 最大 1000x1000 PNG) 按页面上的实际尺寸缩成 WebP，
+# 文件名带内容哈希写进 static/assets/，由 Streamlit 静态服务以 app/static/... 提供，页面里不再内联 base64。
+# 原图或尺寸一变文件名就变，不会拿到旧图; 缓存头由 Streamlit 的静态服务决定 (不带长期 Cache-Control)
+IMAGE_DIR_PATH = os.path.join(ROOT_DIR, "esimages")
+STATIC_DIR_PATH = os.path.join(ROOT_DIR, "static")
+ASSET_DIR_PATH = os.path.join(STATIC_DIR_PATH, "assets")
+ASSET_URL_PREFIX = "app/static/assets"
+
+# 槽位: (宽, 高, 是否裁成方形)。按 2x 像素密度生成: .hero-img 180px, .sub-card-img 220px,
+# 背景平铺宽度约为视口的 1/3
+ASSET_SLOTS = {
+    "hero": (360, 360, True),
+    "sub": (440, 440, True),
+    "bg": (640, None, False),
+}
+WEBP_QUALITY = 80
+
+# (文件名, 槽位) -> (内容哈希, WebP 字节, 静态文件名)
+_asset_cache = {}
+
+def resolve_image(file_name):
+    # 找不到原扩展名时依次尝试其他常见扩展名
+    direct_path = os.path.join(IMAGE_DIR_PATH, file_name)
+    if os.path.exists(direct_path): return direct_path
+    base_name = os.path.splitext(file_name)[0]
+    for ext in ['.jpg', '.png', '.webp', '.jpeg']:
+        temp_path = os.path.join(IMAGE_DIR_PATH, base_name + ext)
+        if os.path.exists(temp_path): return temp_path
+    return None
+
+def render_thumbnail(data, slot):
+    from PIL import Image, ImageOps
+    width, height, square = ASSET_SLOTS[slot]
+    img = Image.open(io.BytesIO(data))
+    img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+    if square:
+        img = ImageOps.fit(img, (width, height), Image.LANCZOS)
+    elif img.width > width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format="WEBP", quality=WEBP_QUALITY)
+    return out.getvalue()
+
+def _asset_name(file_name, slot, digest):
+    return f"{os.path.splitext(file_name)[0]}-{slot}-{digest}.webp"
+
+def get_asset(file_name, slot):
+    # 每个进程每张图每个槽位只读盘/生成一次
+    key = (file_name, slot)
+    if key in _asset_cache: return _asset_cache[key]
+
+    path = resolve_image(file_name)
+    if not path: return None
+    with open(path, "rb") as f: data = f.read()
+    # 哈希取自原图字节 + 槽位参数，原图或尺寸一变，URL 就变
+    digest = hashlib.sha1(data + repr((ASSET_SLOTS[slot], WEBP_QUALITY)).encode()).hexdigest()[:12]
+
+    out_path = os.path.join(ASSET_DIR_PATH, _asset_name(os.path.basename(path), slot, digest))
+    if os.path.exists(out_path):
+        with open(out_path, "rb") as f: webp = f.read()
+    else:
+        webp = render_thumbnail(data, slot)
+        os.makedirs(ASSET_DIR_PATH, exist_ok=True)
+        # 冷启动时几个会话可能同时生成同一张图: 临时文件名按进程/线程区分; 目标文件已经在了就算成功
+        tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f: f.write(webp)
+            os.replace(tmp_path, out_path)
+        except OSError:
+            if not os.path.exists(out_path): raise
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+
+    _asset_cache[key] = (digest, webp, os.path.basename(out_path))
+    return _asset_cache[key]
+
+def get_asset_url(file_name, slot):
+    asset = get_asset(file_name, slot)
+    if not asset: return ""
+    return f"{ASSET_URL_PREFIX}/{asset[2]}"
+
+def build_all(slot_map):
+    # 预生成: slot_map = {槽位: [文件名, ...]}
+    built = []
+    for slot, names in slot_map.items():
+        for name in names:
+            if get_asset(name, slot): built.append((slot, name))
+    return built
+
+def default_slot_map():
+    names = sorted(os.listdir(IMAGE_DIR_PATH)) if os.path.isdir(IMAGE_DIR_PATH) else []
+    return {slot: names for slot in ASSET_SLOTS}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ES Tracker image assets")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="pre-generate WebP thumbnails for every image and slot")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        built = build_all(default_slot_map())
+        print(f"built {len(built)} asset(s) into {ASSET_DIR_PATH}")
@@ -0,0 +1,55 @@
+import os
+import json
+
+from .config import CACHE_DIR_PATH, ROOT_DIR, STORE_DIR_PATH
+from .editions import EDITIONS_PATH, load_rules
+
+# --- 追踪对象目录 ---
+# catalog.json 列出要追踪的艺人/专辑; 每个对象对应一个 kworb 艺人歌曲页和一套独立的历史分区。
+# "editions" 是对象自己的版本定义文件 (相对仓库根目录，格式同 editions.json: 专辑宇宙的关键词 + 各版本曲目)，
+# 不写就用 editions.json。同一位艺人的几张专辑共用一个歌曲页 (只抓一次)，各自按自己的定义筛选和分类。
+# 默认对象 (仪表盘展示的那个) 的分区放在 store/ 根目录、聚合缓存放在 cache/ 根目录，其余对象各占 store/<id>/、cache/<id>/
+CATALOG_PATH = os.path.join(ROOT_DIR, "catalog.json")
+AGG_CACHE_NAME = "history_agg.pkl"
+KWORB_SONGS_URL = "https://kworb.net/spotify/artist/{artist_id}_songs.html"
+
+_catalog = None
+
+def load_catalog():
+    global _catalog
+    if _catalog is None:
+        with open(CATALOG_PATH, encoding="utf-8") as f: data = json.load(f)
+        entities = []
+        for e in data["entities"]:
+            entity = dict(e)
+            entity.setdefault("url", KWORB_SONGS_URL.format(artist_id=entity["artist_id"]))
+            entity["editions"] = os.path.join(ROOT_DIR, entity["editions"]) if entity.get("editions") else EDITIONS_PATH
+            entities.append(entity)
+        _catalog = {"default": data.get("default", entities[0]["id"]), "entities": entities}
+    return _catalog
+
+def list_entities():
+    return load_catalog()["entities"]
+
+def get_entity(entity_id=None):
+    catalog = load_catalog()
+    entity_id = entity_id or catalog["default"]
+    for entity in catalog["entities"]:
+        if entity["id"] == entity_id: return entity
+    raise KeyError(f"unknown entity: {entity_id}")
+
+def is_default(entity):
+    return entity["id"] == load_catalog()["default"]
+
+def entity_store_dir(entity):
+    if is_default(entity): return STORE_DIR_PATH
+    return os.path.join(STORE_DIR_PATH, entity["id"])
+
+def entity_cache_path(entity):
+    # 历史聚合 (history.update_aggregates) 的落盘位置
+    if is_default(entity): return os.path.join(CACHE_DIR_PATH, AGG_CACHE_NAME)
+    return os.path.join(CACHE_DIR_PATH, entity["id"], AGG_CACHE_NAME)
+
+def entity_rules(entity):
+    # 对象的版本定义 (editions.EditionRules)
+    return load_rules(entity["editions"])
@@ -0,0 +1,67 @@
+import altair as alt
+
+from . import perf
+
+# --- 配色 (页面 CSS 也用这一套) ---
+PRIMARY_COLOR = "#8B0000"
+SECONDARY_COLOR = "#FF6347"
+POSITIVE_COLOR = "#2E8B57"
+NEGATIVE_COLOR = "#B22222"
+EXTRA_EDITION_COLORS = ["#4E79A7", "#F28E2B", "#B07AA1", "#76B7B2", "#EDC948", "#9C755F"]
+
+# --- 图表 (Altair) ---
+def chart_spec(chart):
+    # 序列化成 Vega-Lite spec 以便缓存; 与 st.altair_chart 一样不带 Altair 默认主题的宽高
+    with perf.stage("altair_spec"), alt.theme.enable("none"): return chart.to_dict()
+
+def make_macro_chart(data, title, is_total=False):
+    melted = data.melt('Date', var_name='Version', value_name='Streams')
+    # 版本来自 editions.json (data 除 Date 外的各列，专辑宇宙在最后): 前三个版本用固定配色，之后新增的版本用 Tableau 配色，专辑宇宙是黑色
+    domain_color = [c for c in data.columns if c != 'Date']
+    range_color = [PRIMARY_COLOR, SECONDARY_COLOR, POSITIVE_COLOR, *EXTRA_EDITION_COLORS][:len(domain_color) - 1] + ['#000000']
+
+    y_scale = alt.Scale(zero=False, padding=0, nice=False)
+    y_axis = alt.Axis(title=None, format='.4s', labelExpr="replace(datum.label, 'G', 'B')")
+
+    if is_total:
+        y_scale = alt.Scale(zero=False, nice=False, padding=0.02)
+    
+    chart = alt.Chart(melted).mark_line(point=True, strokeWidth=3).encode(
+        x=alt.X('Date:T', axis=alt.Axis(format='%m-%d', title=None)),
+        y=alt.Y('Streams:Q', scale=y_scale, axis=y_axis),
+        color=alt.Color('Version:N', scale=alt.Scale(domain=domain_color, range=range_color), legend=alt.Legend(title=None, orient='top')),
+        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Version:N'), alt.Tooltip('Streams:Q', format=',')]
+    ).properties(height=350, title=title).interactive()
+
+    return chart
+
+def make_single_song_chart(data, song_name):
+    base = alt.Chart(data).encode(x=alt.X('Date:T', axis=alt.Axis(format='%m-%d', title=None)))
+    scale_total = alt.Scale(zero=False, nice=False, padding=0.05)
+    axis_total = alt.Axis(title='Total Streams', titleColor=PRIMARY_COLOR, labelExpr="replace(format(datum.value, '.2s'), 'G', 'B')")
+    
+    line_total = base.mark_line(color=PRIMARY_COLOR, strokeWidth=3).encode(
+        y=alt.Y('Streams:Q', scale=scale_total, axis=axis_total),
+        tooltip=[alt.Tooltip('Date:T'), alt.Tooltip('Streams:Q', format=',', title='Total')]
+    )
+    
+    scale_daily = alt.Scale(zero=False, nice=False, padding=0.05)
+    
+    line_daily = base.mark_line(color=POSITIVE_COLOR, strokeWidth=2, strokeDash=[5,5]).encode(
+        y=alt.Y('Daily:Q', scale=scale_daily, axis=alt.Axis(title='Daily Increase', titleColor=POSITIVE_COLOR, format=',.0f')),
+        tooltip=[alt.Tooltip('Date:T'), alt.Tooltip('Daily:Q', format=',', title='Daily')]
+    )
+    
+    chart = alt.layer(line_total, line_daily).resolve_scale(y='independent').properties(height=350, title=f"Trend: {song_name}").interactive()
+    return chart
+
+def make_songs_compare_chart(data, value_col, title):
+    # 多首歌同一指标对比，每首歌一条线
+    y_axis = alt.Axis(title=None, format='.3s', labelExpr="replace(datum.label, 'G', 'B')")
+    chart = alt.Chart(data).mark_line(strokeWidth=2).encode(
+        x=alt.X('Date:T', axis=alt.Axis(format='%m-%d', title=None)),
+        y=alt.Y(f'{value_col}:Q', scale=alt.Scale(zero=False, nice=False, padding=0.05), axis=y_axis),
+        color=alt.Color('Song:N', legend=alt.Legend(title=None, orient='top', columns=1, labelLimit=400)),
+        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Song:N'), alt.Tooltip(f'{value_col}:Q', format=',')]
+    ).properties(height=350, title=title).interactive()
+    return chart
@@ -0,0 +1,102 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+from .config import CACHE_DIR_PATH
+from .editions import DEFAULT_RULES
+from .utils import fix_encoding
+
+# --- 全局筛选标准 ---
+# 关键词和各版本的曲目在 editions.json 里 (es_tracker.editions); 每套定义 (EditionRules) 各编一次:
+# 所有关键词编进一个正则; "同时包含" 的特例 (如 live 版) 用前瞻表达
+_relevant_res = {}
+
+def _relevant_re(rules):
+    pattern = _relevant_res.get(rules.fingerprint)
+    if pattern is None:
+        pattern = _relevant_res[rules.fingerprint] = re.compile(
+            r"(?s)^(?:" + "".join("".join(f"(?=.*{re.escape(t)})" for t in group) + "|" for group in rules.all_of)
+            + ".*?(?:" + "|".join(re.escape(k) for k in rules.keywords) + "))"
+        )
+    return pattern
+
+def is_relevant_track(name, rules=DEFAULT_RULES):
+    return _relevant_re(rules).match(name.lower()) is not None
+
+# --- 分类定义 ---
+_CATEGORY_RE = re.compile(r"(?P<live>live|snl)|(?P<acap>a cappella)|(?P<inst>instrumental)")
+
+# 移除了 emoji
+def get_track_category(song_name, rules=DEFAULT_RULES):
+    s = song_name.lower().strip()
+    # 版本里指定了分类的曲目 (Deluxe CD)
+    for category, songs in rules.category_sets.items():
+        if s in songs: return category
+    # 一次扫描找出所有命中的标记，优先级: Live > A Cappella > Instrumental
+    found = {k for m in _CATEGORY_RE.finditer(s) for k, v in m.groupdict().items() if v}
+    if "live" in found: return "Live"
+    if "acap" in found: return "A Cappella"
+    if "inst" in found: return "Instrumental"
+    return "Other"
+
+# 规则指纹: 关键词或版本定义一改，依赖分类结果的缓存就全部失效
+def rules_version(rules=DEFAULT_RULES):
+    return hashlib.sha1(repr(("editions", rules.fingerprint)).encode()).hexdigest()[:12]
+
+RULES_VERSION = rules_version()
+
+# --- 持久化的 歌名 -> 分类 备忘表 ---
+# 每天重复出现的几百个歌名只分类一次，结果随规则指纹一起落盘; 每套定义一个文件
+CLASSIFY_MEMO_PATH = os.path.join(CACHE_DIR_PATH, "classify_memo.pkl")
+_memos = {}
+_dirty = set()
+
+def memo_path(rules=DEFAULT_RULES):
+    if rules is DEFAULT_RULES: return CLASSIFY_MEMO_PATH
+    return os.path.join(CACHE_DIR_PATH, f"classify_memo.{rules.name}.pkl")
+
+def _load_memo(rules):
+    memo = _memos.get(rules.fingerprint)
+    if memo is None:
+        memo = _memos[rules.fingerprint] = {}
+        try:
+            with open(memo_path(rules), "rb") as f: saved = pickle.load(f)
+            if saved.get("rules") == rules_version(rules): memo.update(saved["names"])
+        except Exception: pass
+    return memo
+
+def save_memo(rules=DEFAULT_RULES):
+    if rules.fingerprint not in _dirty: return
+    path = memo_path(rules)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 重放时多个子进程会同时存备忘表: 临时文件名按进程/线程区分
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f: pickle.dump({"rules": rules_version(rules), "names": _memos[rules.fingerprint]}, f)
+    os.replace(tmp_path, path)
+    _dirty.discard(rules.fingerprint)
+
+def classify_name(raw_name, rules=DEFAULT_RULES):
+    # 原始歌名 -> (修正编码后的歌名, 是否属于专辑宇宙, 分类, 版本位掩码)
+    memo = _load_memo(rules)
+    hit = memo.get(raw_name)
+    if hit is None:
+        song = fix_encoding(raw_name)
+        relevant = is_relevant_track(song, rules)
+        hit = memo[raw_name] = (song, relevant, get_track_category(song, rules), rules.song_mask(song, relevant))
+        _dirty.add(rules.fingerprint)
+    return hit
+
+def classify_names(names, rules=DEFAULT_RULES):
+    # 对一列歌名分类: 只对去重后的取值查表，再按编码广播回每一行
+    codes, uniques = pd.factorize(pd.Series(names).astype(object))
+    table = [classify_name(n, rules) for n in uniques]
+    save_memo(rules)
+    songs = np.array([t[0] for t in table], dtype=object)
+    relevant = np.array([t[1] for t in table], dtype=bool)
+    category = np.array([t[2] for t in table], dtype=object)
+    editions = np.array([t[3] for t in table], dtype=rules.mask_dtype)
+    return pd.DataFrame({"Song": songs[codes], "is_relevant": relevant[codes], "Category": category[codes], "Editions": editions[codes]})
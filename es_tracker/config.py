@@ -0,0 +1,14 @@
+import os
+
+# --- 基础路径配置 ---
+# 仓库根目录 (es_tracker 包的上一级)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 旧版每日 CSV 存放在 'es_data' 文件夹中
+DATA_DIR_PATH = os.path.join(ROOT_DIR, "es_data")
+
+# 按月分区的列式历史库
+STORE_DIR_PATH = os.path.join(DATA_DIR_PATH, "store")
+
+# 派生数据缓存 (可随时删除，会自动重建)
+CACHE_DIR_PATH = os.path.join(DATA_DIR_PATH, "cache")
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from . import store
+from .classify import classify_names
+from .config import STORE_DIR_PATH
+from .editions import DEFAULT_RULES
+
+# --- 仪表盘数据 (页面和命令行报告共用，不依赖 Streamlit) ---
+# 版本定义在 editions.json (es_tracker.editions); rules 是追踪对象自己的那一套 (catalog.entity_rules)
+
+def load_latest_day(store_dir=STORE_DIR_PATH):
+    # 最新一天的快照; Daily_Num / Daily_Diff / Daily_Prev_Day / Daily_Percent_Change 入库时已相对前一天算好
+    today_str = store.latest_date(store_dir=store_dir)
+    if today_str is None: return None
+    return store.read_day(today_str, store_dir=store_dir)
+
+# --- 分类 ---
+def filter_and_categorize(df, rules=DEFAULT_RULES, tracks=None):
+    # 每个不同的歌名只查一次备忘表; tracks: 别名表 (store.read_aliases)，版本归属和显示名都按曲目键算，与历史图表一致
+    tracks = tracks or {}
+    classes = classify_names(df['Song'], rules)
+    track_ids = df['Track_ID'] if 'Track_ID' in df.columns else np.full(len(df), None, dtype=object)
+    keys = store.track_keys(classes['Song'].values, np.asarray(track_ids, dtype=object), tracks)
+    masks = rules.track_masks(keys, classes['Editions'].to_numpy(), tracks)
+    # 同一首曲目只留一行; 不同曲目的同名曲目各自保留，显示名带上 ID 区分 (store.display_names)
+    rows = np.nonzero(masks & rules.bits[rules.universe])[0]
+    rows = rows[~pd.Series(keys[rows]).duplicated().to_numpy()]
+    df_filtered = df.iloc[rows].copy()
+    df_filtered['Song'] = store.display_names(keys[rows], tracks)
+    df_filtered['Category'] = _track_categories(classes['Category'].to_numpy(dtype=object)[rows], masks[rows], rules)
+    df_filtered['Editions'] = masks[rows]
+
+    # 版本里指定的分类 (如 Deluxe CD) 排最前
+    cat_order = {c: i for i, c in enumerate([*rules.category_sets, "Live", "Other", "A Cappella", "Instrumental"])}
+    df_filtered['Cat_Rank'] = df_filtered['Category'].map(cat_order).fillna(99)
+    df_filtered = df_filtered.sort_values(['Cat_Rank', 'Daily_Num'], ascending=[True, False]).reset_index(drop=True)
+    return df_filtered
+
+def _track_categories(categories, masks, rules):
+    # 版本指定的分类 (如 Deluxe CD) 也跟着曲目的版本归属走: 改了名的曲目保留，同名的其他曲目归到 Other
+    categories = categories.copy()
+    for category, bits in reversed(rules.category_bits.items()):
+        owns = (masks & bits) > 0
+        categories[(categories == category) & ~owns] = "Other"
+        categories[owns] = category
+    return categories
+
+def edition_summary(final_df, rules=DEFAULT_RULES):
+    # {版本: (总播放, 日增量, 较昨日变化, 曲目数)}，按 editions.json 的顺序，最后是 Full Universe (所有相关曲目)。
+    # 所有版本从 Editions 位掩码一次算出
+    values = np.column_stack([
+        final_df['Streams_Num'].to_numpy(dtype="int64"), final_df['Daily_Num'].to_numpy(dtype="int64"),
+        final_df['Daily_Diff'].to_numpy(dtype="int64"), np.ones(len(final_df), dtype="int64"),
+    ])
+    sums = rules.edition_sums(np.zeros(len(final_df), dtype="int64"), 1, final_df['Editions'].to_numpy(), values)[:, 0, :]
+    return {edition: tuple(int(v) for v in sums[:, i]) for i, edition in enumerate(rules.columns)}
+
+def top_movers(final_df, n=3):
+    # 昨天也有播放的曲目里，日增量涨幅最大 / 最小的 n 首
+    daily_active = final_df[final_df['Daily_Prev_Day'] > 0]
+    return daily_active.nlargest(n, 'Daily_Percent_Change'), daily_active.nsmallest(n, 'Daily_Percent_Change')
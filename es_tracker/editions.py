@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from .config import ROOT_DIR
+
+# --- 版本定义 ---
+# editions.json 声明专辑宇宙 (筛选关键词) 和各个版本收录的曲目 (小写歌名; includes 继承别的版本的曲目，
+# category 给收录的曲目指定分类)。加载时编译成位掩码: 第 i 位 = columns[i]，最后一位是专辑宇宙。
+# label / image 是页面用的短名和配图 (可选)。
+# 每个歌名查一次表得到掩码，之后所有版本的合计都从掩码一次算出，加版本不会多扫一遍数据。
+# 每个追踪对象可以在 catalog.json 里指定自己的定义文件 (load_rules); 模块级的常量是仪表盘默认对象的那一套
+EDITIONS_PATH = os.path.join(ROOT_DIR, "editions.json")
+
+def load_definitions(path=EDITIONS_PATH):
+    with open(path, encoding="utf-8") as f: return json.load(f)
+
+def _resolve(editions):
+    # {版本: 收录曲目 (含 includes 继承来的)}，按文件里的顺序
+    by_name = {e["name"]: e for e in editions}
+    resolved = {}
+
+    def songs_of(name, seen=()):
+        if name in seen: raise ValueError(f"edition includes itself: {' -> '.join(seen + (name,))}")
+        if name not in by_name: raise ValueError(f"unknown edition in includes: {name}")
+        if name not in resolved:
+            e = by_name[name]
+            songs = {s.lower().strip() for s in e.get("songs", [])}
+            for parent in e.get("includes", []): songs |= songs_of(parent, seen + (name,))
+            resolved[name] = frozenset(songs)
+        return resolved[name]
+
+    return {e["name"]: songs_of(e["name"]) for e in editions}
+
+class EditionRules:
+    # 一个定义文件编译后的结果
+    def __init__(self, definitions, name="editions"):
+        self.name = name
+        self.universe = definitions["universe"]["name"]
+        self.keywords = definitions["universe"]["keywords"]
+        self.all_of = definitions["universe"].get("all_of", [])  # 同时包含这些片段的歌名也算
+        self.edition_sets = _resolve(definitions["editions"])
+        self.category_sets = {}
+        for e in definitions["editions"]:
+            if e.get("category"): self.category_sets.setdefault(e["category"], set()).update(self.edition_sets[e["name"]])
+        self.columns = list(self.edition_sets) + [self.universe]
+        self.bits = {edition: 1 << i for i, edition in enumerate(self.columns)}
+        # 分类 -> 指定了这个分类的版本的位 (按曲目的版本归属定分类时用)
+        self.category_bits = {}
+        for e in definitions["editions"]:
+            if e.get("category"): self.category_bits[e["category"]] = self.category_bits.get(e["category"], 0) | self.bits[e["name"]]
+        # 页面展示: 短名 (默认用全名) 和配图文件名 (esimages/ 下，没有为 None)
+        described = definitions["editions"] + [definitions["universe"]]
+        self.labels = {e["name"]: e.get("label", e["name"]) for e in described}
+        self.images = {e["name"]: e.get("image") for e in described}
+        self.mask_dtype = np.min_scalar_type((1 << len(self.columns)) - 1)
+        # 定义指纹: 文件内容一改，依赖分类/版本归属的缓存全部失效
+        self.fingerprint = hashlib.sha1(json.dumps(definitions, sort_keys=True).encode()).hexdigest()[:12]
+        self._song_bits = {}
+        for edition, songs in self.edition_sets.items():
+            for s in songs: self._song_bits[s] = self._song_bits.get(s, 0) | self.bits[edition]
+
+    def song_mask(self, song, relevant):
+        # 单个 (已修正编码的) 歌名的版本位掩码
+        return self._song_bits.get(song.lower().strip(), 0) | (self.bits[self.universe] if relevant else 0)
+
+    def track_masks(self, keys, masks, tracks):
+        # 版本归属按曲目算: keys 是每行的曲目键 (store.track_keys)，masks 是按当行歌名算的位掩码，tracks 是别名表。
+        # 别名表里的曲目取它认领的歌名的版本位: 改了名还算原来的版本，同名的其他曲目没认领这个歌名就不算;
+        # 不在别名表里的键沿用歌名的结果。有版本归属的曲目也算进专辑宇宙
+        universe = self.bits[self.universe]
+        codes, uniques = pd.factorize(pd.Series(keys, dtype=object))
+        owned = np.array([self._claimed_bits(tracks[k]) if k in tracks else -1 for k in uniques] or [-1], dtype="int64")[codes]
+        masks = np.asarray(masks).astype("int64")
+        out = np.where(owned >= 0, (masks & universe) | owned, masks)
+        out = np.where(out & ~universe, out | universe, out)
+        return out.astype(self.mask_dtype)
+
+    def _claimed_bits(self, track):
+        bits = 0
+        for song in track.get("claims", []): bits |= self._song_bits.get(song.lower().strip(), 0)
+        return bits
+
+    def membership(self, masks):
+        # 位掩码 -> (len(masks), 版本数) 的 0/1 矩阵
+        return ((np.asarray(masks, dtype="int64")[:, None] >> np.arange(len(self.columns))) & 1)
+
+    def edition_sums(self, group_codes, n_groups, masks, values):
+        # values: (行数, k) 的整数矩阵; 返回 (k, n_groups, 版本数): 每组每个版本的合计。
+        # 先按 (组, 位掩码) 求一次和 (不同的掩码只有寥寥几种)，再乘 掩码 × 版本 的 0/1 矩阵展开到各个版本
+        mask_codes, uniques = pd.factorize(np.asarray(masks))
+        n_masks = max(len(uniques), 1)
+        grouped = pd.DataFrame(values).groupby(np.asarray(group_codes) * n_masks + mask_codes).sum()
+        grid = np.zeros((n_groups * n_masks, values.shape[1]), dtype="int64")
+        grid[grouped.index.to_numpy()] = grouped.to_numpy()
+        member = self.membership(uniques) if len(uniques) else np.zeros((1, len(self.columns)), dtype="int64")
+        return np.einsum("gmv,me->vge", grid.reshape(n_groups, n_masks, values.shape[1]), member)
+
+_rules = {}
+
+def load_rules(path=EDITIONS_PATH):
+    # 每个定义文件只编译一次
+    path = os.path.abspath(path)
+    if path not in _rules:
+        _rules[path] = EditionRules(load_definitions(path), os.path.splitext(os.path.basename(path))[0])
+    return _rules[path]
+
+DEFAULT_RULES = load_rules()
+UNIVERSE = DEFAULT_RULES.universe
+UNIVERSE_KEYWORDS = DEFAULT_RULES.keywords
+UNIVERSE_ALL_OF = DEFAULT_RULES.all_of
+EDITION_SETS = DEFAULT_RULES.edition_sets
+CATEGORY_SETS = DEFAULT_RULES.category_sets
+EDITION_COLUMNS = DEFAULT_RULES.columns
+EDITION_BITS = DEFAULT_RULES.bits
+MASK_DTYPE = DEFAULT_RULES.mask_dtype
+FINGERPRINT = DEFAULT_RULES.fingerprint
+song_mask = DEFAULT_RULES.song_mask
+membership = DEFAULT_RULES.membership
+edition_sums = DEFAULT_RULES.edition_sums
@@ -0,0 +1,117 @@
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import perf
+
+# --- 并发抓取 ---
+# 一个带连接池的 Session 被所有线程共用; 每个 host 限制并发数和两次请求之间的最小间隔，
+# 失败 (超时 / 429 / 5xx) 由 urllib3 按指数退避重试
+HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "gzip, deflate"}
+TIMEOUT = 15
+MAX_WORKERS = 8
+HOST_CONCURRENCY = 4
+HOST_MIN_INTERVAL = 0.25  # 秒
+RETRY = Retry(total=3, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+              allowed_methods=("GET",), respect_retry_after_header=True)
+
+class HostLimiter:
+    def __init__(self, concurrency=HOST_CONCURRENCY, min_interval=HOST_MIN_INTERVAL):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def _slot(self, host):
+        with self._lock:
+            if host not in self._slots: self._slots[host] = threading.Semaphore(self.concurrency)
+            return self._slots[host]
+
+    def _wait_turn(self, host):
+        # 同一 host 的请求起点至少间隔 min_interval
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now: time.sleep(start - now)
+
+    @contextmanager
+    def limit(self, url):
+        host = urlsplit(url).netloc
+        with self._slot(host):
+            self._wait_turn(host)
+            yield
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=RETRY)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+_limiter = HostLimiter()
+
+def fetch(url, session=None):
+    # 返回页面 bytes，失败 (重试用尽后) 返回 None
+    session = session or get_session()
+    try:
+        with _limiter.limit(url):
+            r = session.get(url, timeout=TIMEOUT)
+        r.raise_for_status()
+        perf.count("fetch_bytes", len(r.content))
+        return r.content
+    except Exception:
+        perf.count("fetch_errors")
+        return None
+
+def fetch_conditional(url, etag=None, last_modified=None, session=None):
+    # 带 If-None-Match / If-Modified-Since 的 GET。返回 {"status", "content", "etag", "last_modified"}，
+    # 304 时 content 为 None; 失败 (重试用尽后) 返回 None
+    session = session or get_session()
+    headers = {}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    try:
+        with _limiter.limit(url):
+            r = session.get(url, headers=headers, timeout=TIMEOUT)
+        if r.status_code == 304:
+            perf.count("fetch_not_modified")
+            return {"status": 304, "content": None, "etag": etag, "last_modified": last_modified}
+        r.raise_for_status()
+        perf.count("fetch_bytes", len(r.content))
+        # 压缩传输时 Content-Length 是线上的字节数
+        if r.headers.get("Content-Encoding"): perf.count("fetch_wire_bytes", int(r.headers.get("Content-Length") or 0))
+        return {"status": r.status_code, "content": r.content,
+                "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    except Exception:
+        perf.count("fetch_errors")
+        return None
+
+def _fetch_many(fn, urls, max_workers):
+    urls = list(dict.fromkeys(urls))
+    if not urls: return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        return dict(zip(urls, pool.map(fn, urls)))
+
+def fetch_all(urls, session=None, max_workers=MAX_WORKERS):
+    # 并发抓取一组 URL (自动去重)，返回 {url: bytes 或 None}; 总耗时约等于最慢的那一个
+    session = session or get_session()
+    return _fetch_many(lambda u: fetch(u, session), urls, max_workers)
+
+def fetch_all_conditional(validators, session=None, max_workers=MAX_WORKERS):
+    # validators: {url: (etag, last_modified)}; 返回 {url: fetch_conditional 的结果}
+    session = session or get_session()
+    return _fetch_many(lambda u: fetch_conditional(u, *validators[u], session=session), validators, max_workers)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+# --- 里程碑预测 ---
+# 所有单曲 + 所有版本的累计播放量排成一个 (序列 × 日历日) 矩阵，
+# 对每日增量的对数做加权最小二乘，一次拟合出每条序列的指数衰减/增长率:
+#     daily(t) = rate * exp(decay * t)
+# 越近的日子权重越大 (半衰期 HALF_LIFE 天)。再用闭式解算出到下一个里程碑还要多少天
+HALF_LIFE = 28
+# 里程碑步长: 10 亿以下每 1 亿一档，50 亿以下每 5 亿一档，之后每 10 亿一档
+MILESTONE_STEPS = ((1_000_000_000, 100_000_000), (5_000_000_000, 500_000_000), (np.inf, 1_000_000_000))
+FORECAST_COLUMNS = ["Name", "Kind", "Streams", "Daily_Rate", "Decay", "Milestone", "Remaining", "Days_To_Go", "ETA"]
+
+def next_milestones(streams):
+    streams = np.asarray(streams, dtype="float64")
+    step = np.select([streams < bound for bound, _ in MILESTONE_STEPS], [s for _, s in MILESTONE_STEPS])
+    return (np.floor(streams / step) + 1) * step
+
+def format_milestone(value):
+    if value >= 1_000_000_000: return f"{value / 1_000_000_000:g}B"
+    return f"{value / 1_000_000:g}M"
+
+def stream_matrix(hist_total, song_matrix):
+    # 行 = 版本 (hist_total 除 Date 外的各列) + 单曲 (SongMatrix)，列 = 连续的日历日; 中间缺的日子线性插值，首次出现之前为 NaN
+    editions = [c for c in hist_total.columns if c != "Date"]
+    dates = pd.to_datetime(hist_total["Date"])
+    calendar = pd.date_range(dates.min(), dates.max(), freq="D")
+    n_ed = len(editions)
+    matrix = np.full((n_ed + len(song_matrix.names), len(calendar)), np.nan)
+    day_idx = ((dates - calendar[0]).dt.days).to_numpy()
+    matrix[:n_ed, day_idx] = hist_total[editions].to_numpy(dtype="float64").T
+    song_days = (pd.to_datetime(song_matrix.dates) - calendar[0]).days.to_numpy()
+    matrix[n_ed:, song_days] = np.where(song_matrix.present, song_matrix.streams, np.nan)
+
+    matrix = pd.DataFrame(matrix.T, index=calendar).interpolate(method="time", limit_area="inside").to_numpy().T
+    names = np.concatenate([np.array(editions, dtype=object), np.asarray(song_matrix.names, dtype=object)])
+    kinds = np.array(["edition"] * n_ed + ["song"] * len(song_matrix.names))
+    return names, kinds, calendar, matrix
+
+def fit_trends(matrix, half_life=HALF_LIFE):
+    # matrix: (n, T) 累计值。返回每行最后一天的拟合日增量 rate 和衰减率 decay (<= 0)
+    n, T = matrix.shape
+    if T < 2: return np.zeros(n), np.zeros(n)
+    daily = np.diff(matrix, axis=1)
+    valid = ~np.isnan(daily)
+    y = np.log1p(np.clip(np.nan_to_num(daily), 0, None))
+    x = np.arange(T - 1, dtype="float64")
+    w = 0.5 ** ((x[-1] - x) / half_life) * valid
+
+    sw = w.sum(axis=1)
+    sx = (w * x).sum(axis=1)
+    sy = (w * y).sum(axis=1)
+    sxx = (w * x * x).sum(axis=1)
+    sxy = (w * x * y).sum(axis=1)
+    denom = sw * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(np.abs(denom) > 1e-12, (sw * sxy - sx * sy) / denom, 0.0)
+        intercept = np.where(sw > 0, (sy - slope * sx) / sw, 0.0)
+    # 只有一天增量的序列: 斜率为 0，水平取那一天
+    slope = np.nan_to_num(slope)
+    intercept = np.nan_to_num(intercept)
+
+    # 不外推增长: 上升中的歌按当前速度算，偏保守
+    decay = np.minimum(slope, 0.0)
+    rate = np.clip(np.expm1(intercept + slope * x[-1]), 0, None)
+    return rate, decay
+
+def days_to_reach(remaining, rate, decay):
+    # ∫0^T rate·e^(decay·t) dt = remaining 的解; 衰减到永远达不到时为 inf
+    remaining, rate, decay = (np.asarray(a, dtype="float64") for a in (remaining, rate, decay))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flat = remaining / rate
+        arg = 1 + decay * remaining / rate
+        decayed = np.where(arg > 0, np.log(arg) / decay, np.inf)
+        days = np.where(np.abs(decay) < 1e-9, flat, decayed)
+    return np.where(rate > 0, days, np.inf)
+
+def forecast_milestones(hist_total, song_matrix, half_life=HALF_LIFE):
+    # 返回每个版本/单曲的下一个里程碑及预计达成日期 (达不到时 ETA 为 None)，按剩余天数排序
+    if hist_total is None or hist_total.empty: return pd.DataFrame(columns=FORECAST_COLUMNS)
+    names, kinds, dates, matrix = stream_matrix(hist_total, song_matrix)
+    rate, decay = fit_trends(matrix, half_life)
+
+    # 每行最后一个有值的累计数 (已经下榜的歌停在最后出现的那天)
+    has = ~np.isnan(matrix)
+    last_idx = matrix.shape[1] - 1 - np.argmax(has[:, ::-1], axis=1)
+    streams = matrix[np.arange(len(names)), last_idx]
+    milestone = next_milestones(streams)
+    remaining = milestone - streams
+    days = days_to_reach(remaining, rate, decay)
+    # 不在最新一天的行已经不再更新，不给预测
+    days = np.where(last_idx == matrix.shape[1] - 1, days, np.inf)
+
+    reachable = days < 36500  # 百年以上当作达不到
+    eta = pd.Series(dates[-1] + pd.to_timedelta(np.ceil(np.where(reachable, days, 0)), unit="D"))
+    eta = eta.dt.strftime("%Y-%m-%d").where(reachable, None)
+    out = pd.DataFrame({
+        "Name": names, "Kind": kinds, "Streams": streams, "Daily_Rate": rate, "Decay": decay,
+        "Milestone": milestone, "Remaining": remaining, "Days_To_Go": days, "ETA": eta,
+    })
+    return out.sort_values(["Days_To_Go", "Name"], kind="stable").reset_index(drop=True)
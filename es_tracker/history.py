@@ -0,0 +1,348 @@
+import os
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+from . import perf, shared_cache, store
+from .classify import classify_names, rules_version
+from .config import CACHE_DIR_PATH, STORE_DIR_PATH
+from .editions import DEFAULT_RULES, MASK_DTYPE
+from .series import RollingSums, ROLLUP_FREQS, POINT_BUDGET, rollup, pick_resolution, downsample
+
+# --- 持久化的每日聚合 ---
+# 聚合结果 (版本合计 + 单曲明细) 落盘保存，按分区指纹判断哪些月份变了，
+# 变了的月份里再按每天内容的哈希只重算真正新增/改动的日期
+AGG_CACHE_PATH = os.path.join(CACHE_DIR_PATH, "history_agg.pkl")
+AGG_CACHE_FORMAT = 9
+
+def partition_fingerprint(path):
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}".encode()).hexdigest()[:16]
+
+@perf.timed("store_version")
+def store_version(store_dir=STORE_DIR_PATH, rules=DEFAULT_RULES):
+    # 整个历史库的数据版本: 分类规则 + 每个分区的 (文件名, mtime, size)
+    parts = [(month, partition_fingerprint(path)) for month, path in store.list_partitions(store_dir)]
+    return hashlib.sha1(repr((rules_version(rules), parts)).encode()).hexdigest()[:16]
+
+def _day_hashes(df):
+    # 每行内容哈希后按天求和 (uint64 溢出回绕)，一次算出所有日期的内容指纹
+    hashed = pd.util.hash_pandas_object(df[store.STORE_COLUMNS[1:]], index=False)
+    return {d: format(int(h), "016x") for d, h in hashed.groupby(df["Date"].values).sum().items()}
+
+# --- 单曲历史的紧凑表示 ---
+MISSING = -1  # 当天不在榜
+
+class SongMatrix:
+    # 每首曲目、每个日期只存一份; 播放数 / 日增量是 (曲目 × 日期) 的定宽整数矩阵，不在榜的格子为 MISSING。
+    # 占用只和 曲目数 × 天数 的数值块有关，不再每天复制一遍歌名字符串。
+    # 行按曲目键 (store.track_keys: Track_ID 或 "name:歌名") 排序，names 是对应的显示名 (按别名表取最新的歌名)
+    def __init__(self, keys, dates, streams, daily, editions, names=None):
+        self.keys = pd.Index(keys, dtype=object)     # 曲目键，升序
+        # 必须是副本: np.asarray 会直接借用 Index 的底层数组，replace_days 写显示名时会把曲目键一起改掉
+        self.names = np.array(self.keys if names is None else names, dtype=object)
+        self.dates = np.asarray(dates, dtype=object)  # 'YYYY-MM-DD' 升序
+        self.streams = streams                        # int64
+        self.daily = daily                            # int32
+        self.editions = editions                      # 版本位掩码 (EditionRules.bits)
+
+    @classmethod
+    def empty(cls, keys=(), dates=(), mask_dtype=MASK_DTYPE):
+        shape = (len(keys), len(dates))
+        return cls(keys, dates, np.full(shape, MISSING, dtype="int64"), np.zeros(shape, dtype="int32"),
+                   np.zeros(len(keys), dtype=mask_dtype))
+
+    @classmethod
+    def from_rows(cls, dates, keys, streams, daily, editions):
+        # 长表的每一行 -> 一个格子 (editions 为每行歌名的位掩码); 同一天同一曲目的多行取累计值最大的那行
+        song_codes, uniq_keys = pd.factorize(keys, sort=True)
+        date_codes, uniq_dates = pd.factorize(dates, sort=True)
+        out = cls.empty(uniq_keys, uniq_dates, editions.dtype)
+        key = song_codes * len(uniq_dates) + date_codes
+        order = np.lexsort((streams, key))
+        keep = order[np.r_[key[order][1:] != key[order][:-1], True]]
+        out.streams[song_codes[keep], date_codes[keep]] = streams[keep]
+        out.daily[song_codes[keep], date_codes[keep]] = daily[keep]
+        out.editions[song_codes] = editions
+        return out
+
+    @property
+    def present(self):
+        return self.streams != MISSING
+
+    @property
+    def nbytes(self):
+        return self.streams.nbytes + self.daily.nbytes + self.editions.nbytes
+
+    def take(self, rows):
+        return SongMatrix(self.keys[rows], self.dates, self.streams[rows], self.daily[rows], self.editions[rows], self.names[rows])
+
+    def song_frame(self, row):
+        ok = self.streams[row] != MISSING
+        return pd.DataFrame({
+            "Date": self.dates[ok], "Song": self.names[row],
+            "Streams": self.streams[row, ok], "Daily": self.daily[row, ok].astype("int64"),
+        })
+
+    def to_frame(self):
+        # 展开成长表 (Date, Song, Streams, Daily)，按日期、显示名排序; Song 为共用同一份歌名的 categorical
+        order = np.argsort(self.names, kind="stable")
+        date_idx, rank = np.nonzero(self.present[order].T)
+        song_idx = order[rank]
+        return pd.DataFrame({
+            "Date": self.dates[date_idx], "Song": pd.Categorical.from_codes(rank, self.names[order]),
+            "Streams": self.streams[song_idx, date_idx], "Daily": self.daily[song_idx, date_idx].astype("int64"),
+        })
+
+    def replace_days(self, new, dates):
+        # 去掉 dates 这些天，再放入 new (只含新增/改动日期); 不再有任何在榜日子的曲目一并去掉
+        keep = ~np.isin(self.dates, list(dates))
+        keys = self.keys.union(new.keys)
+        all_dates = np.union1d(self.dates[keep], new.dates).astype(object)
+        out = SongMatrix.empty(keys, all_dates, np.result_type(self.editions, new.editions))
+        for part, cols in ((self, keep), (new, slice(None))):
+            rows = keys.get_indexer(part.keys)
+            cells = np.ix_(rows, np.searchsorted(all_dates, part.dates[cols]))
+            out.streams[cells] = part.streams[:, cols]
+            out.daily[cells] = part.daily[:, cols]
+            out.editions[rows] = part.editions
+            out.names[rows] = part.names
+        alive = out.present.any(axis=1)
+        return out if alive.all() else out.take(alive)
+
+# --- 批量历史流水线 ---
+def build_history_tables(df, tracks=None, rules=DEFAULT_RULES):
+    # df: 多天拼接在一起的快照 (Date, Song, Track_ID, Streams_Num, Daily_Num, ...); tracks: 别名表 (store.read_aliases);
+    # rules: 版本定义 (EditionRules)
+    # 每日增量用入库时算好的 Daily_Num (与页面顶部数字同一口径)，而不是 kworb 原始的 Daily_Raw
+    # 歌名只在去重后的取值上查一次分类备忘表 (含版本位掩码)，然后按 (日期, 掩码) 一次求和展开到所有版本
+    # 单曲按曲目键归行: 改了名的曲目还是同一行，同名的不同曲目各占一行; 版本归属也按曲目算 (EditionRules.track_masks)
+    # 返回 (版本累计表, 版本日增量表, 单曲 SongMatrix)
+    tracks = tracks or {}
+    codes, uniques = pd.factorize(df['Song'])
+    classes = classify_names(uniques, rules)
+    track_ids = df['Track_ID'] if 'Track_ID' in df.columns else np.full(len(df), None, dtype=object)
+    keys = store.track_keys(classes['Song'].values[codes], np.asarray(track_ids, dtype=object), tracks)
+    row_bits = rules.track_masks(keys, classes['Editions'].to_numpy()[codes], tracks)
+
+    streams = df['Streams_Num'].to_numpy(dtype="int64")
+    daily = df['Daily_Num'].to_numpy(dtype="int64")
+    date_codes, dates = pd.factorize(df['Date'], sort=True)
+    sums = rules.edition_sums(date_codes, len(dates), row_bits, np.column_stack([streams, daily]))
+    hist_total_df = pd.DataFrame(sums[0], columns=rules.columns).assign(Date=np.asarray(dates, dtype=object))[["Date"] + rules.columns]
+    hist_daily_df = pd.DataFrame(sums[1], columns=rules.columns).assign(Date=np.asarray(dates, dtype=object))[["Date"] + rules.columns]
+
+    valid = (row_bits & rules.bits[rules.universe]) > 0
+    song_matrix = SongMatrix.from_rows(df['Date'].values[valid], keys[valid], streams[valid], daily[valid], row_bits[valid])
+    song_matrix.names = store.display_names(song_matrix.keys, tracks)
+    return hist_total_df, hist_daily_df, song_matrix
+
+# --- 按歌索引的单曲历史 ---
+class SongIndex:
+    # 显示名 -> SongMatrix 的行号。每个数据版本建一次，之后取某首歌只展开它自己那一行，与曲库大小无关
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.names = sorted(matrix.names)
+        self.rows = {name: i for i, name in enumerate(matrix.names)}
+
+    def __contains__(self, song):
+        return song in self.rows
+
+    def get(self, song):
+        row = self.rows.get(song)
+        if row is None: return pd.DataFrame(columns=["Date", "Song", "Streams", "Daily"])
+        return self.matrix.song_frame(row)
+
+    def get_many(self, songs):
+        parts = [self.get(s) for s in songs if s in self.rows]
+        if not parts: return self.get(None)
+        return pd.concat(parts, ignore_index=True)
+
+    def find(self, needle):
+        # 第一个 (按歌名排序) 包含 needle 的歌，忽略大小写
+        needle = needle.lower()
+        return next((name for name in self.names if needle in name.lower()), None)
+
+def _empty_cache(rules):
+    return {
+        "format": AGG_CACHE_FORMAT, "rules": rules_version(rules), "aliases": None, "partitions": {}, "day_hashes": {},
+        "total": pd.DataFrame(columns=["Date"] + rules.columns),
+        "daily": pd.DataFrame(columns=["Date"] + rules.columns),
+        "songs": SongMatrix.empty(mask_dtype=rules.mask_dtype),
+        "rolling": RollingSums(rules.columns),
+        "song_index": SongIndex(SongMatrix.empty()),
+        "rollups": {},
+    }
+
+# 多个进程 / 副本共用同一份聚合: 重建时拿跨进程锁，同一时刻只有一个在建，其它的等它写完直接读结果。
+# 共享缓存不在本机 (Redis) 时聚合结果另外推一份上去，新起的副本本地没有缓存时先拿它垫底，
+# 分区指纹对不上的月份只需读分区核对每天的内容哈希，内容一样就不用重建
+def _shared_key(path):
+    return f"history_agg:{os.path.relpath(path, CACHE_DIR_PATH)}"
+
+def _valid(cache, rules):
+    # 格式或分类规则变了，旧的聚合结果不可信
+    return isinstance(cache, dict) and cache.get("format") == AGG_CACHE_FORMAT and cache.get("rules") == rules_version(rules)
+
+def _load_cache(path, rules):
+    try:
+        with open(path, "rb") as f: cache = pickle.load(f)
+    except Exception: cache = None
+    if _valid(cache, rules): return cache
+    shared = shared_cache.get_cache()
+    if not shared.local:
+        cache = shared.get(_shared_key(path))
+        if _valid(cache, rules): return cache
+    return _empty_cache(rules)
+
+def _save_cache(cache, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f: pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    shared = shared_cache.get_cache()
+    if not shared.local: shared.set(_shared_key(path), cache)
+
+def _replace_days(old, new, dates):
+    kept = old[~old['Date'].isin(dates)]
+    if new is None or new.empty: return kept.reset_index(drop=True)
+    if kept.empty: return new.reset_index(drop=True)
+    return pd.concat([kept, new], ignore_index=True).sort_values('Date', kind='stable').reset_index(drop=True)
+
+def _update_rolling(cache, stale_dates):
+    # 只是在末尾追加了新的日子 (或最后一天被重新抓取): 逐天推进滚动窗口; 更早的日期有改动/删除: 整体重建
+    rolling = cache["rolling"]
+    total = cache["total"]
+    columns = _edition_columns(total)
+    last = rolling.last_date.strftime("%Y-%m-%d") if rolling.last_date is not None else ""
+    if all(d >= last for d in stale_dates) and set(stale_dates) <= set(total["Date"]):
+        for _, row in total[total["Date"].isin(stale_dates)].iterrows():
+            rolling.push(row["Date"], row[columns].to_numpy(dtype="float64"))
+    else:
+        cache["rolling"] = RollingSums.from_frame(total, columns)
+
+@perf.timed("history_update")
+def update_aggregates(store_dir=STORE_DIR_PATH, cache_path=AGG_CACHE_PATH, rules=DEFAULT_RULES):
+    cache = _load_cache(cache_path, rules)
+    parts = store.list_partitions(store_dir)
+    if cache["partitions"] == {month: partition_fingerprint(path) for month, path in parts}:
+        perf.cache_result("history_agg", True)
+        return cache
+    with shared_cache.get_cache().lock(_shared_key(cache_path)):
+        # 等锁期间别的进程可能已经建好了
+        return _update_locked(store_dir, cache_path, rules)
+
+def _update_locked(store_dir, cache_path, rules):
+    cache = _load_cache(cache_path, rules)
+    # 别名表和分区总是一起写; 别名变了 (新曲目、改名) 时曲目键和显示名都可能变，整体重建
+    tracks = store.read_aliases(store_dir)
+    aliases = store.aliases_version(tracks)
+    if cache["aliases"] != aliases:
+        cache = _empty_cache(rules)
+        cache["aliases"] = aliases
+    parts = store.list_partitions(store_dir)
+    live_months = {month for month, _ in parts}
+    stale_dates = set()
+    changed_frames = []
+    changed = False
+
+    # 分区被删掉的月份
+    for month in [m for m in cache["partitions"] if m not in live_months]:
+        del cache["partitions"][month]
+        for d in [d for d in cache["day_hashes"] if d[:7] == month]:
+            del cache["day_hashes"][d]
+            stale_dates.add(d)
+        changed = True
+
+    for month, path in parts:
+        fp = partition_fingerprint(path)
+        if cache["partitions"].get(month) == fp: continue
+
+        with perf.stage("history_read"): month_df = store.read_partition(month, store_dir=store_dir)
+        hashes = _day_hashes(month_df)
+        new_dates = {d for d, h in hashes.items() if cache["day_hashes"].get(d) != h}
+        gone = {d for d in cache["day_hashes"] if d[:7] == month and d not in hashes}
+        for d in gone: del cache["day_hashes"][d]
+        for d in new_dates: cache["day_hashes"][d] = hashes[d]
+        stale_dates |= new_dates | gone
+        if new_dates: changed_frames.append(month_df[month_df['Date'].isin(new_dates)])
+        cache["partitions"][month] = fp
+        changed = True
+
+    perf.cache_result("history_agg", not changed)
+    if not changed: return cache
+
+    # 所有新增/改动的日期拼成一批，只跑一次流水线
+    new_total = new_daily = new_songs = None
+    if changed_frames:
+        batch = pd.concat(changed_frames, ignore_index=True)
+        perf.count("rows_processed", len(batch), stage="history_build")
+        with perf.stage("history_build"): new_total, new_daily, new_songs = build_history_tables(batch, tracks, rules)
+    cache["total"] = _replace_days(cache["total"], new_total, stale_dates)
+    cache["daily"] = _replace_days(cache["daily"], new_daily, stale_dates)
+    cache["songs"] = cache["songs"].replace_days(new_songs if new_songs is not None else SongMatrix.empty(mask_dtype=rules.mask_dtype), stale_dates)
+    _update_rolling(cache, stale_dates)
+    cache["song_index"] = SongIndex(cache["songs"])
+    cache["rollups"] = _build_rollups(cache["total"], cache["daily"])
+    with perf.stage("history_save"): _save_cache(cache, cache_path)
+    return cache
+
+# --- 图表数据: 按时间跨度挑分辨率 + 降采样 ---
+def _edition_columns(df):
+    # 版本合计表里除 Date 以外的列 (各追踪对象的版本不同)
+    return [c for c in df.columns if c != "Date"]
+
+def _build_rollups(total, daily):
+    # 预先算好的周/月汇总，图表看长跨度时直接取
+    columns = _edition_columns(total)
+    return {freq: (rollup(total, freq, last_columns=columns), rollup(daily, freq, mean_columns=columns))
+            for freq in ROLLUP_FREQS}
+
+def _range_start(df, range_days):
+    # 最近 range_days 个日历日的起始日期; None = 全部
+    if not range_days: return df["Date"].iloc[0]
+    return (pd.Timestamp(df["Date"].iloc[-1]) - pd.Timedelta(days=range_days - 1)).strftime("%Y-%m-%d")
+
+def _span_days(df, start):
+    return (pd.Timestamp(df["Date"].iloc[-1]) - pd.Timestamp(max(start, df["Date"].iloc[0]))).days + 1
+
+def chart_tables(total, daily, rollups, range_days=None, budget=POINT_BUDGET):
+    # 返回 (累计表, 日增量表, 分辨率 'D'/'W'/'M')，每条线的点数不超过 budget
+    if total.empty: return total, daily, "D"
+    start = _range_start(total, range_days)
+    resolution = pick_resolution(_span_days(total, start))
+    if resolution != "D": total, daily = rollups[resolution]
+    columns = _edition_columns(total)
+    total = downsample(total[total["Date"] >= start].reset_index(drop=True), columns, budget)
+    daily = downsample(daily[daily["Date"] >= start].reset_index(drop=True), columns, budget)
+    return total, daily, resolution
+
+def get_chart_tables(range_days=None, budget=POINT_BUDGET, store_dir=STORE_DIR_PATH, cache_path=AGG_CACHE_PATH, rules=DEFAULT_RULES):
+    cache = update_aggregates(store_dir, cache_path, rules)
+    return chart_tables(cache["total"], cache["daily"], cache["rollups"], range_days, budget)
+
+def song_chart_table(song_df, range_days=None, budget=POINT_BUDGET):
+    # 单首歌 (SongIndex.get 的结果) 的图表数据，汇总/降采样规则与版本图表一致
+    if song_df.empty: return song_df, "D"
+    start = _range_start(song_df, range_days)
+    song_df = song_df[song_df["Date"] >= start].reset_index(drop=True)
+    resolution = pick_resolution(_span_days(song_df, start))
+    if resolution != "D":
+        song_df = rollup(song_df, resolution, last_columns=["Song", "Streams"], mean_columns=["Daily"])
+    return downsample(song_df, ["Streams", "Daily"], budget), resolution
+
+def get_song_index(store_dir=STORE_DIR_PATH, cache_path=AGG_CACHE_PATH, rules=DEFAULT_RULES):
+    return update_aggregates(store_dir, cache_path, rules)["song_index"]
+
+def get_historical_charts_data(store_dir=STORE_DIR_PATH, cache_path=AGG_CACHE_PATH, rules=DEFAULT_RULES):
+    cache = update_aggregates(store_dir, cache_path, rules)
+    if cache["total"].empty: return None, None, None, None
+
+    hist_total_df = cache["total"]
+    hist_daily_df = cache["daily"]
+    song_matrix = cache["songs"]
+
+    # 最近 7/28/90 个日历日的增量 (缺的日子按插值补齐): {窗口天数: {"days": 实际覆盖天数, "sums": {版本: 增量}}}
+    window_stats = cache["rolling"].stats()
+    return hist_total_df, hist_daily_df, song_matrix, window_stats
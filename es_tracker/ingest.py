@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import hashlib
+import statistics
+import argparse
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+from . import catalog, fetch, perf, shared_cache, store
+from .config import STORE_DIR_PATH
+from .kworb import parse_songs_table
+from .metrics import derive_daily_metrics, normalize_kworb_table
+
+# --- 抓取 + 入库 ---
+REFRESH_INTERVAL = 3600  # 秒; 平时的轮询间隔
+RETRY_DELAY = 60
+INTRADAY_LOG = True  # 当天每份内容不同的快照另存一份日志
+INGEST_META_PATH = os.path.join(STORE_DIR_PATH, "_ingest.json")
+
+def get_kworb_data(entity=None):
+    # 单个追踪对象 (默认是仪表盘展示的那个) 当前的歌曲表
+    entity = entity or catalog.get_entity()
+    content = fetch.fetch(entity["url"])
+    if content is None: return None
+    try: return parse_songs_table(content)
+    except: return None
+
+def read_ingest_meta():
+    try:
+        with open(INGEST_META_PATH) as f: return json.load(f)
+    except Exception: return {}
+
+def _write_ingest_meta(meta):
+    os.makedirs(os.path.dirname(INGEST_META_PATH), exist_ok=True)
+    tmp_path = f"{INGEST_META_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f: json.dump(meta, f)
+    os.replace(tmp_path, INGEST_META_PATH)
+
+# --- 按 kworb 更新时间调度 ---
+# kworb 的歌曲表大约每天更新一次。记下每次看到页面内容变化的时刻 (UTC 一天中的秒数)，
+# 取最近几次的中位数作为预计更新时刻; 在它前后的窗口里还没看到当天的更新时每 POLL_FAST 秒查一次，
+# 其余时间每 REFRESH_INTERVAL 查一次。观测不够时每 POLL_LEARN 查一次。
+# 每次查询都是条件 GET (ETag / Last-Modified)，没变时 kworb 回 304，页面内容哈希没变时也不解析
+DAY = 86400
+POLL_FAST = 300
+POLL_LEARN = 900
+WINDOW_BEFORE = 1800
+WINDOW_AFTER = 7200
+MIN_OBSERVATIONS = 3
+UPDATE_HISTORY = 14
+
+def expected_update_time(update_times):
+    # 一天中的秒数; 以第一次观测为参照取中位数，跨午夜的观测也能正确平均
+    if len(update_times) < MIN_OBSERVATIONS: return None
+    ref = update_times[0]
+    offsets = [(t - ref + DAY / 2) % DAY - DAY / 2 for t in update_times]
+    return (ref + statistics.median(offsets)) % DAY
+
+def next_poll_at(entity_meta, interval=REFRESH_INTERVAL):
+    # 下一次该查询的时间戳; 从没抓过时为 0 (立即)
+    last = entity_meta.get("fetched_at")
+    if last is None: return 0
+    expected = expected_update_time(entity_meta.get("update_times", []))
+    if expected is None: return last + min(POLL_LEARN, interval)
+    changed = entity_meta.get("changed_at", 0)
+    base = last - last % DAY
+    for k in (-1, 0, 1):
+        start = base + k * DAY + expected - WINDOW_BEFORE
+        end = start + WINDOW_BEFORE + WINDOW_AFTER
+        # 在窗口里、而且这一轮还没看到更新: 勤查
+        if start <= last < end and changed < start: return last + POLL_FAST
+        if last < start: return min(last + interval, start)
+    return last + interval
+
+def poll_due_at(interval=REFRESH_INTERVAL):
+    # 所有追踪对象里最早该查询的时间戳
+    fetched = read_ingest_meta().get("entities", {})
+    return min(next_poll_at(fetched.get(e["id"], {}), interval) for e in catalog.list_entities())
+
+def poll_due(now=None, interval=REFRESH_INTERVAL):
+    return poll_due_at(interval) <= (now or datetime.now()).timestamp()
+
+def _stored_snapshot(entity_meta, store_dir):
+    # 上一次入库的原始快照 (页面内容没变时原样沿用，不用重新解析)
+    date_str = entity_meta.get("date")
+    if not date_str: return None
+    df = store.read_day(date_str, columns=store.RAW_COLUMNS, store_dir=store_dir)
+    return df if len(df) else None
+
+# --- 共享的页面快照 ---
+# 每次从 kworb 拿到的页面连同校验头和抓取时间放进跨进程共享缓存 (es_tracker.shared_cache)，
+# 多台机器上的副本各自入库时只有第一个真正请求 kworb
+PAGE_TTL = DAY
+
+def _page_key(url):
+    return f"page:{url}"
+
+def _shared_pages(entities, known, now, interval):
+    # {url: 抓取结果}，只取按这个对象自己的排期还不该再查询的条目
+    cache = shared_cache.get_cache()
+    pages = {}
+    for e in entities:
+        entry = cache.get(_page_key(e["url"]))
+        if entry is None or entry["fetched_at"] <= known.get(e["id"], {}).get("fetched_at", 0): continue
+        if next_poll_at({**known.get(e["id"], {}), "fetched_at": entry["fetched_at"]}, interval) <= now.timestamp(): continue
+        perf.count("shared_page_hits")
+        pages[e["url"]] = entry
+    return pages
+
+def _publish_pages(results, now):
+    cache = shared_cache.get_cache()
+    for url, res in results.items():
+        if res is None: continue
+        if res["content"] is None:
+            # 304: 共享的还是同一份页面时只刷新抓取时间
+            entry = cache.get(_page_key(url))
+            if entry is None or entry["etag"] != res["etag"] or entry["last_modified"] != res["last_modified"]: continue
+            res = entry
+        cache.set(_page_key(url), {**res, "status": 200, "fetched_at": now.timestamp()}, ttl=PAGE_TTL)
+
+@perf.timed("ingest")
+def ingest_once(now=None, entities=None, interval=REFRESH_INTERVAL):
+    # 并发抓取所有追踪对象的 kworb 页，各自写入自己的历史分区;
+    # 抓取失败的对象保留旧数据。返回写入的日期，全部失败时返回 None
+    now = now or datetime.now()
+    entities = entities or catalog.list_entities()
+    today_str = now.strftime("%Y-%m-%d")
+    meta = read_ingest_meta()
+    known = meta.setdefault("entities", {})
+    # 今天已经入过库的对象才带校验头: 304 时直接沿用今天的数据; 跨天后的第一次完整抓取
+    # 别的进程 / 副本刚抓过的页面 (按自己的排期还不到下一次查询) 直接用共享缓存里的，不再请求 kworb
+    shared = _shared_pages(entities, known, now, interval)
+    validators = {}
+    for e in entities:
+        if e["url"] in shared: continue
+        em = known.get(e["id"], {})
+        validators[e["url"]] = (em.get("etag"), em.get("last_modified")) if em.get("date") == today_str else (None, None)
+    results = {}
+    if validators:
+        with perf.stage("fetch"): results = fetch.fetch_all_conditional(validators)
+        _publish_pages(results, now)
+    results.update(shared)
+
+    ok = False
+    for entity in entities:
+        res = results.get(entity["url"])
+        if res is None: continue
+        em = known.get(entity["id"], {})
+        seen_at = res.get("fetched_at", now.timestamp())
+        store_dir = catalog.entity_store_dir(entity)
+        body_hash = hashlib.sha1(res["content"]).hexdigest() if res["content"] is not None else em.get("body_hash")
+        unchanged = res["status"] == 304 or (body_hash is not None and body_hash == em.get("body_hash"))
+        if unchanged and em.get("date") == today_str:
+            # 页面没变、今天也已入库: 不解析，只刷新查询时间
+            perf.count("parse_skipped")
+            em.update(fetched_at=seen_at, etag=res["etag"], last_modified=res["last_modified"])
+            known[entity["id"]] = em
+            ok = True
+            continue
+
+        raw_df = _stored_snapshot(em, store_dir) if unchanged else None
+        if raw_df is not None: perf.count("parse_skipped")
+        elif res["content"] is not None:
+            with perf.stage("parse"):
+                try: raw_df = parse_songs_table(res["content"])
+                except Exception: raw_df = None
+        if raw_df is None: continue
+        perf.count("rows_processed", len(raw_df), stage="parse")
+
+        with perf.stage("normalize"): today_df = normalize_kworb_table(raw_df)
+        # 派生列在入库时算好，页面和图表直接读
+        with perf.stage("derive_metrics"):
+            prev_date = store.latest_date(before=today_str, store_dir=store_dir)
+            prev_df = store.read_day(prev_date, columns=store.RAW_COLUMNS, store_dir=store_dir) if prev_date else None
+            today_df = derive_daily_metrics(today_df, prev_df)
+        # 内容没变时不重写分区，只刷新抓取时间
+        with perf.stage("store_write"): changed = store.append_day(today_str, today_df, store_dir=store_dir)
+        if changed and INTRADAY_LOG: store.append_intraday(today_str, today_df, now.timestamp(), store_dir=store_dir)
+
+        # 页面内容变了: 记下看到变化的时刻。只有上一次查询足够近时这个时刻才准，才拿来学习更新时间
+        update_times = em.get("update_times", [])
+        changed_at = em.get("changed_at")
+        if not unchanged:
+            if em.get("body_hash") and seen_at - em.get("fetched_at", 0) <= 2 * interval:
+                update_times = (update_times + [seen_at % DAY])[-UPDATE_HISTORY:]
+            changed_at = seen_at
+        known[entity["id"]] = {
+            "date": today_str, "fetched_at": seen_at, "rows": len(today_df),
+            "etag": res["etag"], "last_modified": res["last_modified"], "body_hash": body_hash,
+            "changed_at": changed_at, "update_times": update_times,
+        }
+        ok = True
+
+    if not ok: return None
+    _write_ingest_meta(meta)
+    return today_str
+
+# --- single-flight ---
+# 同一进程里同时只跑一次刷新; 刷新进行中再来的调用方 (页面冷启动、后台线程) 等它结束并复用结果。
+# 进程之间 (多个 Streamlit 副本、外部的抓取进程) 靠共享缓存的锁: 拿到锁后再看一次是否该查询，
+# 等锁期间别的进程刚抓完时直接返回它入库的日期。force=True (命令行抓一次) 时不管排期
+_inflight = None
+_inflight_lock = threading.Lock()
+
+def _committed_date(entities=None):
+    fetched = read_ingest_meta().get("entities", {})
+    dates = [fetched.get(e["id"], {}).get("date") for e in entities or catalog.list_entities()]
+    return max((d for d in dates if d), default=None)
+
+def _refresh_shared(now, entities, interval, force):
+    with store.writer_lock():
+        if not force and not poll_due(now, interval):
+            perf.count("ingest_deduplicated")
+            return _committed_date(entities)
+        return ingest_once(now, entities, interval)
+
+def refresh(now=None, entities=None, interval=REFRESH_INTERVAL, force=False):
+    global _inflight
+    with _inflight_lock:
+        flight = _inflight
+        leader = flight is None
+        if leader: flight = _inflight = Future()
+    if not leader: return flight.result()
+
+    try:
+        result = _refresh_shared(now, entities, interval, force)
+        flight.set_result(result)
+        return result
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock: _inflight = None
+
+def snapshot_age(now=None, entity_id=None):
+    # 已提交快照距今多少秒; 不指定对象时取所有追踪对象里最旧的那个 (任何一个没有快照时为 None)
+    fetched = read_ingest_meta().get("entities", {})
+    ids = [entity_id] if entity_id else [e["id"] for e in catalog.list_entities()]
+    if any(i not in fetched for i in ids): return None
+    oldest = min(fetched[i]["fetched_at"] for i in ids)
+    return (now or datetime.now()).timestamp() - oldest
+
+# --- 后台抓取线程 ---
+# 页面只读已提交的快照; 到了该查询的时候叫醒线程在后台刷新 (stale-while-revalidate)。
+# 也可以单独跑 `python -m es_tracker.ingest`; 两边都按 _ingest.json 里的查询记录排期，
+# 外部进程保持数据新鲜时页面里的线程不会重复抓取
+class IngestWorker(threading.Thread):
+    def __init__(self, interval=REFRESH_INTERVAL):
+        super().__init__(name="es-ingest", daemon=True)
+        self.interval = interval
+        self.last_success = None
+        self.last_error = None
+        self.last_attempt = 0
+        self._wake = threading.Event()
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            # 失败后至少隔 RETRY_DELAY 再试，页面频繁叫醒也不会连续请求 kworb
+            if poll_due(interval=self.interval) and time.time() - self.last_attempt >= RETRY_DELAY:
+                self.last_attempt = time.time()
+                try:
+                    if refresh(interval=self.interval): self.last_success = time.time()
+                    else: self.last_error = "fetch failed"
+                except Exception as e:
+                    self.last_error = repr(e)
+            # 睡到下一次该查询的时候，或被页面提前叫醒
+            wait = max(poll_due_at(self.interval) - time.time(), RETRY_DELAY)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_worker(interval=REFRESH_INTERVAL):
+    # 每个进程只启动一个后台线程
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = IngestWorker(interval)
+            _worker.start()
+        return _worker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ES Tracker kworb ingestion worker")
+    parser.add_argument("--once", action="store_true", help="fetch a single snapshot and exit")
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL, help="seconds between polls outside kworb's update window")
+    parser.add_argument("--entity", action="append", help="only fetch these catalog ids (with --once)")
+    args = parser.parse_args()
+
+    store.ensure_store()
+    if args.once:
+        entities = [catalog.get_entity(i) for i in args.entity] if args.entity else None
+        date_str = refresh(entities=entities, interval=args.interval, force=True)
+        print(f"ingested {date_str}" if date_str else "fetch failed")
+    else:
+        worker = start_worker(args.interval)
+        worker.join()
@@ -0,0 +1,57 @@
+import re
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+# --- kworb 歌曲表解析 ---
+# lxml 建树后直接定位表头含 'Song Title' 的那张表，按列取出歌名/链接/数字，
+# 不为页面上其它表格建 DataFrame，数字整列向量化清洗，不再逐格 try/except
+SONGS_COLUMNS = ("Song Title", "Streams", "Daily")
+TRACK_ID_RE = re.compile(r"track/([A-Za-z0-9]+)")
+_HTML_PARSER = etree.HTMLParser(encoding="utf-8")
+
+def clean_numbers(values):
+    # clean_number 的向量化版本: 去掉千分位，小数截断取整，无法解析的记为 0
+    s = pd.Series(values, dtype=object).str.replace(",", "", regex=False)
+    return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64").to_numpy()
+
+def _cell_text(cell):
+    return "".join(cell.itertext()).strip()
+
+def find_songs_table(doc):
+    for th in doc.iter("th"):
+        if _cell_text(th) == "Song Title":
+            for table in th.iterancestors("table"): return table
+    return None
+
+def parse_songs_table(content):
+    # content: 页面的 bytes (或 str)。返回 DataFrame(Song, Streams_Num, Daily_Raw, Track_ID)，找不到表时返回 None
+    if isinstance(content, str): content = content.encode("utf-8")
+    doc = etree.fromstring(content, _HTML_PARSER)
+    if doc is None: return None
+    table = find_songs_table(doc)
+    if table is None: return None
+
+    header = next(tr for tr in table.iter("tr") if tr.find("th") is not None)
+    labels = [_cell_text(th) for th in header.findall("th")]
+    if not all(c in labels for c in SONGS_COLUMNS): return None
+    i_song, i_streams, i_daily = (labels.index(c) for c in SONGS_COLUMNS)
+    width = max(i_song, i_streams, i_daily)
+
+    # 每列用一条 XPath 在 C 里取出整列单元格，只有歌名需要逐个拼接文本
+    rows = f"(./tr | ./tbody/tr)[count(td) > {width}]"
+    song_tds = table.xpath(f"{rows}/td[{i_song + 1}]")
+    songs = ["".join(td.itertext()).strip() for td in song_tds]
+    links = [td.find(".//a") for td in song_tds]
+    hrefs = [a.get("href", "") if a is not None else "" for a in links]
+    streams = [td.text for td in table.xpath(f"{rows}/td[{i_streams + 1}]")]
+    daily = [td.text for td in table.xpath(f"{rows}/td[{i_daily + 1}]")]
+    track_ids = pd.Series(hrefs, dtype=object).str.extract(TRACK_ID_RE, expand=False)
+
+    if not songs: return None
+    return pd.DataFrame({
+        "Song": np.array(songs, dtype=object),
+        "Streams_Num": clean_numbers(streams),
+        "Daily_Raw": clean_numbers(daily),
+        "Track_ID": track_ids.to_numpy(dtype=object),
+    })
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from .classify import classify_names
+from .store import NAME_KEY_PREFIX
+
+# --- 每日派生指标 ---
+# 入库时按 "当天 vs 前一天" 算好，和原始数字一起存进历史库; 页面和图表直接读
+DERIVED_COLUMNS = ["Daily_Num", "Streams_Num_Prev", "Daily_Prev_Day", "Daily_Diff", "Daily_Percent_Change"]
+
+def normalize_kworb_table(raw_df):
+    # 歌名修正编码 (只在入库时做这一次)，同一首曲目 (同一个 Track_ID; 没有 ID 时同名) 的多行合并成一行。
+    # 不同 ID 的同名曲目各自保留
+    today_df = raw_df.copy()
+    today_df['Song'] = classify_names(today_df['Song'])['Song'].values
+    if 'Track_ID' not in today_df.columns: today_df['Track_ID'] = None
+    key = today_df['Track_ID'].where(today_df['Track_ID'].notna(), NAME_KEY_PREFIX + today_df['Song'])
+    out = today_df.groupby(key.values, sort=True).agg({'Song': 'first', 'Track_ID': 'first', 'Streams_Num': 'max', 'Daily_Raw': 'max'})
+    return out.sort_values('Song', kind='stable').reset_index(drop=True)
+
+def _prev_values(today_df, prev_df):
+    # today_df 每一行前一天的 (累计值, 原始日增量)，前一天没有的为 0。按 Track_ID 对齐; 前一天没有 ID 的老数据按歌名对齐。
+    # 两边的键一起编成整数，之后按整数连接; 同一个键前一天有多行时各列取最大
+    def ids(df): return df['Track_ID'].to_numpy(dtype=object) if 'Track_ID' in df.columns else np.full(len(df), None, dtype=object)
+    today_ids, prev_ids = ids(today_df), ids(prev_df)
+    prev_has_id = ~pd.isna(prev_ids)
+    prev_vals = prev_df[['Streams_Num', 'Daily_Raw']].to_numpy(dtype="int64")
+    out = np.zeros((len(today_df), 2), dtype="int64")
+    matched = np.zeros(len(today_df), dtype=bool)
+    for by_name, today_keys, prev_keys, prev_ok in (
+        (False, today_ids, prev_ids, prev_has_id),
+        (True, today_df['Song'].to_numpy(dtype=object), prev_df['Song'].to_numpy(dtype=object), ~prev_has_id),
+    ):
+        todo = ~matched & ~pd.isna(today_keys)
+        if by_name:
+            # 带 ID 的同名曲目里只有累计播放最大的那首接上前一天 (与 store 别名表的认领规则一致)
+            with_id = pd.DataFrame({"k": today_keys, "s": today_df['Streams_Num'].to_numpy()})[todo & ~pd.isna(today_ids)]
+            todo[with_id.index.to_numpy()] = False
+            todo[with_id.sort_values("s", ascending=False, kind="stable").drop_duplicates("k").index.to_numpy()] = True
+        if not todo.any() or not prev_ok.any(): continue
+        n_prev = int(prev_ok.sum())
+        codes, _ = pd.factorize(np.concatenate([prev_keys[prev_ok], today_keys[todo]]))
+        per_key = pd.DataFrame(prev_vals[prev_ok]).groupby(codes[:n_prev]).max()
+        pos = per_key.index.get_indexer(codes[n_prev:])
+        hit = np.nonzero(todo)[0][pos >= 0]
+        out[hit] = per_key.to_numpy()[pos[pos >= 0]]
+        matched[hit] = True
+    return out
+
+def derive_daily_metrics(today_df, prev_df=None):
+    # today_df / prev_df: (Song, Track_ID, Streams_Num, Daily_Raw); prev_df 为 None 表示没有前一天。
+    # 歌名入库前已经修正过，这里不再逐行修正
+    merged = today_df[[c for c in ['Song', 'Track_ID', 'Streams_Num', 'Daily_Raw'] if c in today_df.columns]].copy()
+    merged['Daily_Num'] = merged['Daily_Raw']
+    merged['Daily_Prev_Day'] = 0
+    merged['Streams_Num_Prev'] = 0
+    merged['Daily_Percent_Change'] = 0.0
+
+    if prev_df is not None and not prev_df.empty:
+        prev_vals = _prev_values(merged, prev_df)
+        merged['Streams_Num_Prev'] = prev_vals[:, 0]
+        merged['Daily_Prev_Day'] = prev_vals[:, 1]
+
+        merged['Daily_Calc'] = merged['Streams_Num'] - merged['Streams_Num_Prev']
+
+        is_new = merged['Streams_Num_Prev'] == 0
+        merged['Daily_Num'] = merged['Daily_Calc']
+        merged.loc[is_new, 'Daily_Num'] = merged.loc[is_new, 'Daily_Raw']
+
+        mask_fallback = (merged['Daily_Num'] <= 0) & (merged['Daily_Raw'] > 0)
+        merged.loc[mask_fallback, 'Daily_Num'] = merged.loc[mask_fallback, 'Daily_Raw']
+        merged = merged.drop(columns=['Daily_Calc'])
+
+    merged['Daily_Diff'] = merged['Daily_Num'] - merged['Daily_Prev_Day']
+
+    valid_prev_daily = merged['Daily_Prev_Day'] > 0
+    merged.loc[valid_prev_daily, 'Daily_Percent_Change'] = (
+        merged['Daily_Diff'] / merged['Daily_Prev_Day'] * 100
+    )
+
+    for c in ["Daily_Num", "Streams_Num_Prev", "Daily_Prev_Day", "Daily_Diff"]:
+        merged[c] = merged[c].astype("int64")
+    merged['Daily_Percent_Change'] = merged['Daily_Percent_Change'].astype("float64")
+    return merged
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from collections import defaultdict
+
+from .config import CACHE_DIR_PATH
+
+# --- 分阶段计时 + 计数器 ---
+# with perf.stage("parse"): ...   计时一个阶段，计入进程累计值; 在 perf.run() 里时还记进这一轮的明细
+# perf.count("rows_processed", n, stage="parse")   计数器 (带标签)
+# 每个阶段/计数在 DEBUG 级别往 logger "es_tracker.perf" 打一行 JSON; 累计值可导出成 Prometheus 文本格式
+logger = logging.getLogger("es_tracker.perf")
+METRICS_PATH = os.path.join(CACHE_DIR_PATH, "metrics.prom")
+TEXTFILE_MIN_INTERVAL = 60  # 秒; 导出文件最多这么久写一次
+
+_lock = threading.Lock()
+_stage_seconds = defaultdict(float)
+_stage_calls = defaultdict(int)
+_counters = defaultdict(float)  # (指标名, ((标签, 值), ...)) -> 累计值
+_local = threading.local()
+
+class Run:
+    # 一轮页面重跑 / 一次命令行任务里各阶段的耗时明细 (按开始顺序，depth 为嵌套层数)
+    def __init__(self):
+        self.stages = []
+        self.counters = defaultdict(float)
+        self.depth = 0
+        self.started = time.perf_counter()
+        self.seconds = None
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def begin_run():
+    # 没法套 with 的地方 (比如 Streamlit 脚本的顶层) 用 begin_run / end_run
+    r = _local.run = Run()
+    return r
+
+def end_run(r):
+    r.seconds = time.perf_counter() - r.started
+    if current_run() is r: _local.run = None
+    return r
+
+@contextmanager
+def run():
+    outer = current_run()
+    r = begin_run()
+    try: yield r
+    finally:
+        end_run(r)
+        _local.run = outer
+
+def _log(event, **fields):
+    if logger.isEnabledFor(logging.DEBUG): logger.debug(json.dumps({"event": event, **fields}, ensure_ascii=False))
+
+@contextmanager
+def stage(name):
+    # 在 perf.run() 里时 yield 这一阶段的明细条目，否则 yield None
+    r = current_run()
+    entry = None
+    if r is not None:
+        entry = {"stage": name, "depth": r.depth, "ms": None, "cache": None}
+        r.stages.append(entry)
+        r.depth += 1
+    t0 = time.perf_counter()
+    try: yield entry
+    finally:
+        dt = time.perf_counter() - t0
+        with _lock:
+            _stage_seconds[name] += dt
+            _stage_calls[name] += 1
+        if r is not None:
+            r.depth -= 1
+            entry["ms"] = dt * 1000
+        _log("stage", stage=name, ms=round(dt * 1000, 3))
+
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name): return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock: _counters[key] += value
+    r = current_run()
+    if r is not None: r.counters[key] += value
+    _log("count", metric=name, value=value, **labels)
+
+# --- 缓存命中统计 ---
+def _misses():
+    if not hasattr(_local, "misses"): _local.misses = defaultdict(int)
+    return _local.misses
+
+def cached(name, cache):
+    # 给一个缓存装饰器 (st.cache_data(...) 之类) 加上计时和命中/未命中计数: 函数体真正执行了就是未命中。
+    # 用法: @perf.cached("render_page", st.cache_data(max_entries=4))，functools.lru_cache(...) 也行
+    def decorate(fn):
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            _misses()[name] += 1
+            return fn(*args, **kwargs)
+        cached_fn = cache(compute)
+
+        @functools.wraps(fn)
+        def lookup(*args, **kwargs):
+            before = _misses()[name]
+            with stage(name) as entry:
+                result = cached_fn(*args, **kwargs)
+                hit = _misses()[name] == before
+                if entry is not None: entry["cache"] = "hit" if hit else "miss"
+            cache_result(name, hit)
+            return result
+        lookup.clear = getattr(cached_fn, "clear", None) or cached_fn.cache_clear
+        return lookup
+    return decorate
+
+def cache_result(name, hit):
+    count("cache_requests", cache=name, result="hit" if hit else "miss")
+
+# --- 输出 ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs):
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def prometheus_text():
+    # 进程启动以来的累计值
+    with _lock:
+        seconds, calls, counters = dict(_stage_seconds), dict(_stage_calls), dict(_counters)
+    lines = [
+        "# HELP es_stage_seconds_total Time spent in each pipeline stage.",
+        "# TYPE es_stage_seconds_total counter",
+    ]
+    lines += [f"es_stage_seconds_total{_labels([('stage', s)])} {v:.6f}" for s, v in sorted(seconds.items())]
+    lines += ["# HELP es_stage_calls_total Times each pipeline stage ran.", "# TYPE es_stage_calls_total counter"]
+    lines += [f"es_stage_calls_total{_labels([('stage', s)])} {v}" for s, v in sorted(calls.items())]
+    for name in sorted({n for n, _ in counters}):
+        lines.append(f"# TYPE es_{name}_total counter")
+        lines += [f"es_{name}_total{_labels(labels)} {v:g}" for (n, labels), v in sorted(counters.items()) if n == name]
+    return "\n".join(lines) + "\n"
+
+_last_written = {}
+
+def write_textfile(path=METRICS_PATH, min_interval=TEXTFILE_MIN_INTERVAL):
+    # 给 node_exporter 的 textfile collector 读; 先写临时文件再 rename。
+    # 页面每轮重跑结束都会调用: 每个进程每个路径最多 min_interval 秒落盘一次，返回这次是否写了
+    now = time.monotonic()
+    with _lock:
+        if path in _last_written and now - _last_written[path] < min_interval: return False
+        _last_written[path] = now
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f: f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return True
+
+def format_run(r):
+    # 一轮的明细，纯文本 (命令行 --timings 用)
+    lines = [f"{'  ' * e['depth'] + e['stage']:<40}{e['ms'] or 0:>10.1f} ms" + (f"  ({e['cache']})" if e["cache"] else "") for e in r.stages]
+    total = r.seconds if r.seconds is not None else time.perf_counter() - r.started
+    lines.append(f"{'total':<40}{total * 1000:>10.1f} ms")
+    lines += [f"{name}{_labels(labels)} = {v:g}" for (name, labels), v in sorted(r.counters.items())]
+    return "\n".join(lines)
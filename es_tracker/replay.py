@@ -0,0 +1,117 @@
+import os
+import re
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from . import store
+from .config import STORE_DIR_PATH
+from .kworb import parse_songs_table
+from .metrics import derive_daily_metrics, normalize_kworb_table
+
+# --- 历史重放 ---
+# 分类规则或派生指标的算法改了以后，把库里每一天的原始快照 (Song, Streams_Num, Daily_Raw)
+# 重新走一遍当前的入库流水线: 歌名修正去重 + 相对前一天的派生列。
+# 每天只依赖前一天的原始快照，所以按月分给进程池并行; 结果先写进一个新的历史版本目录，
+# 全部写完再整体换上，原来的版本留在 <store>.prev 以便回退。
+# 别名表 (store/_tracks.json) 不让子进程并发去 "读-改-写": 子进程只交回每天的 (Track_ID, Song, Streams_Num)，
+# 主进程按日期顺序一次写入
+ALIAS_COLUMNS = ["Track_ID", "Song", "Streams_Num"]
+
+def _replay_month(month, prev_date, src_dir, dst_dir):
+    # 在子进程里执行: 重算一个月写进 dst_dir 的分区，返回 {日期: 别名列}
+    df = store.read_history(columns=store.RAW_COLUMNS, start=prev_date or f"{month}-01", end=f"{month}-31", store_dir=src_dir)
+    by_date = {d: normalize_kworb_table(day) for d, day in df.groupby("Date", sort=True)}
+    prev_df = by_date.pop(prev_date, None)
+    days = {}
+    for d, day in by_date.items():
+        days[d] = derive_daily_metrics(day, prev_df)
+        prev_df = day
+    store.append_days(days, store_dir=dst_dir, aliases=False)
+    return {d: day[ALIAS_COLUMNS] for d, day in days.items()}
+
+def _month_plan(store_dir):
+    # [(月份, 该月第一天之前最近的有数据日期)]
+    plan, prev = [], None
+    months = {}
+    for d in store.list_dates(store_dir): months.setdefault(d[:7], []).append(d)
+    for month, dates in months.items():
+        plan.append((month, prev))
+        prev = dates[-1]
+    return plan
+
+def _partition_stats(store_dir):
+    return {month: (os.stat(path).st_mtime_ns, os.stat(path).st_size) for month, path in store.list_partitions(store_dir)}
+
+def _swap_in(store_dir, new_dir):
+    # 分区以外的东西 (日内日志、抓取记录、其它追踪对象的子目录) 原样带到新版本。
+    # 两次 rename 之间历史库目录有一瞬间不存在，读者会看到空库而不是半新半旧的数据
+    for name in os.listdir(store_dir):
+        if name.endswith((".parquet", ".tmp")): continue
+        src, dst = os.path.join(store_dir, name), os.path.join(new_dir, name)
+        if os.path.isdir(src): shutil.copytree(src, dst)
+        else: shutil.copy2(src, dst)
+    prev_dir = f"{store_dir}.prev"
+    if os.path.exists(prev_dir): shutil.rmtree(prev_dir)
+    os.rename(store_dir, prev_dir)
+    os.rename(new_dir, store_dir)
+
+def replay(store_dir=STORE_DIR_PATH, workers=None, output=None):
+    # 返回 (重算的天数, 耗时秒数)。output 指定时新版本只写到那个目录，不替换现有历史库;
+    # workers=1 时不开进程池，在当前进程里顺序执行
+    t0 = time.perf_counter()
+    before = _partition_stats(store_dir)
+    plan = _month_plan(store_dir)
+    new_dir = output or f"{store_dir}.replay-{time.strftime('%Y%m%d%H%M%S')}"
+    if store.list_partitions(new_dir): raise ValueError(f"{new_dir} already holds a history store")
+    os.makedirs(new_dir, exist_ok=True)
+    try:
+        if workers == 1:
+            results = [_replay_month(month, prev, store_dir, new_dir) for month, prev in plan]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_replay_month, month, prev, store_dir, new_dir) for month, prev in plan]
+                results = [f.result() for f in futures]
+        days = {d: df for r in results for d, df in r.items()}
+        store.update_aliases(days, store_dir=new_dir)
+        n_days = len(days)
+        if output is None:
+            # 重放期间有新的抓取写入时放弃，免得把它覆盖掉
+            if _partition_stats(store_dir) != before: raise RuntimeError("history store changed during replay; run it again")
+            _swap_in(store_dir, new_dir)
+    except BaseException:
+        if output is None: shutil.rmtree(new_dir, ignore_errors=True)
+        raise
+    return n_days, time.perf_counter() - t0
+
+# --- 存档页面回填 ---
+# 用另外存档的 kworb 页面 (文件名里带日期，如 2025-12-03.html / 20251203.html) 补上库里缺的日子
+DATE_IN_NAME_RE = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})")
+
+def page_date(path):
+    m = DATE_IN_NAME_RE.search(os.path.basename(path))
+    if m is None: raise ValueError(f"no date in file name: {path}")
+    return "-".join(m.groups())
+
+def _parse_page(path):
+    with open(path, "rb") as f: raw_df = parse_songs_table(f.read())
+    return None if raw_df is None else normalize_kworb_table(raw_df)
+
+def import_pages(paths, store_dir=STORE_DIR_PATH, overwrite=False, workers=None):
+    # 默认只补缺口，库里已有的日期跳过; 导入后从最早导入的那天起重算派生列。返回导入的日期
+    existing = set() if overwrite else set(store.list_dates(store_dir))
+    todo = {}
+    for path in sorted(paths):
+        date_str = page_date(path)
+        if date_str not in existing: todo[date_str] = path
+    if not todo: return []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsed = dict(zip(todo, pool.map(_parse_page, todo.values())))
+    days = {}
+    for date_str, df in parsed.items():
+        if df is None: print(f"skip {todo[date_str]}: no songs table")
+        else: days[date_str] = df
+    if days:
+        store.append_days(days, store_dir=store_dir)
+        store.recompute(start=min(days), store_dir=store_dir)
+    return sorted(days)
@@ -0,0 +1,155 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# --- 按日历日期索引的时间序列 ---
+# 历史库只有抓到数据的日子 (比如缺 2025-12-03)，按行数取 "7 天前" 会跨错天数。
+# 这里先把序列对齐到连续的日历，缺的日子标记出来，累计值按时间线性插值
+WINDOWS = (7, 28, 90)
+
+def to_calendar(df, columns=None, fill="interpolate"):
+    # df: (Date, 数值列...)，Date 为 'YYYY-MM-DD'。返回以 DatetimeIndex 为索引、每天一行的表，
+    # 多一列 Is_Gap 标记原本缺失的日子; fill="interpolate" 线性插值，fill=None 保留 NaN
+    columns = list(columns) if columns else [c for c in df.columns if c != "Date"]
+    s = df.set_index(pd.to_datetime(df["Date"]))[columns].astype("float64").sort_index()
+    s = s[~s.index.duplicated(keep="last")]
+    if s.empty: return s.assign(Is_Gap=pd.Series(dtype=bool))
+    cal = s.reindex(pd.date_range(s.index[0], s.index[-1], freq="D"))
+    cal.index.name = "Date"
+    gap = cal[columns].isna().all(axis=1)
+    if fill == "interpolate": cal[columns] = cal[columns].interpolate(method="time")
+    cal["Is_Gap"] = gap.values
+    return cal
+
+def missing_dates(df):
+    cal = to_calendar(df[["Date"]].assign(_v=0), ["_v"], fill=None)
+    return [d.strftime("%Y-%m-%d") for d in cal.index[cal["Is_Gap"]]]
+
+# --- 增量滚动窗口 ---
+class RollingSums:
+    # 由每天的累计值 (各版本总播放量) 维护最近 7/28/90 个日历日的增量之和。
+    # 每来一天只做常数次加减: 新一天的增量加进每个窗口，滑出窗口的那天减掉;
+    # 中间缺的日子按线性插值把增量均摊到每一天
+    def __init__(self, columns, windows=WINDOWS):
+        self.columns = list(columns)
+        self.windows = tuple(windows)
+        self.last_date = None
+        self.last_values = None
+        self.prev_values = None  # 最后一天推进前的累计值，同一天被重新抓取时用来改写
+        self.last_gap = 0
+        self.prev_gap_days = 0
+        self.steps = deque(maxlen=max(self.windows))
+        self.sums = {w: np.zeros(len(self.columns)) for w in self.windows}
+
+    def push(self, date, values):
+        # date: 'YYYY-MM-DD' 或 Timestamp，不早于上一次; values: 与 columns 对应的累计值。
+        # 与上一次同一天时 (当天重新抓取) 改写最后一天
+        date = pd.Timestamp(date)
+        values = np.asarray(values, dtype="float64")
+        if self.last_date is not None and date == self.last_date:
+            if self.last_gap: self._replace_last(values)
+            self.last_values = values
+            return
+        if self.last_date is None:
+            self.last_date, self.last_values = date, values
+            return
+        gap = (date - self.last_date).days
+        if gap < 0: raise ValueError(f"{date.date()} is before {self.last_date.date()}")
+        step = (values - self.last_values) / gap
+        # 超过最长窗口的空档，更早的增量反正都会被挤出去
+        self.last_gap = min(gap, self.steps.maxlen)
+        for _ in range(self.last_gap): self._push_step(step)
+        self.prev_gap_days = gap
+        self.prev_values = self.last_values
+        self.last_date, self.last_values = date, values
+
+    def _replace_last(self, values):
+        step = (values - self.prev_values) / self.prev_gap_days
+        delta = step - self.steps[-1]
+        for w in self.windows: self.sums[w] += delta * min(self.last_gap, w)
+        for i in range(1, self.last_gap + 1): self.steps[-i] = step
+
+    def _push_step(self, step):
+        for w in self.windows:
+            self.sums[w] += step
+            if len(self.steps) >= w: self.sums[w] -= self.steps[-w]
+        self.steps.append(step)
+
+    def covered_days(self, window):
+        return min(window, len(self.steps))
+
+    def window(self, window):
+        # 最近 window 天 (不足时为已有的天数) 的增量之和: {列名: 值}
+        return dict(zip(self.columns, self.sums[window].tolist()))
+
+    def stats(self):
+        return {w: {"days": self.covered_days(w), "sums": self.window(w)} for w in self.windows}
+
+    @classmethod
+    def from_frame(cls, df, columns=None, windows=WINDOWS):
+        # 一次性从整张累计值表建立 (历史中间的日期被改动时重建用)
+        columns = list(columns) if columns else [c for c in df.columns if c != "Date"]
+        rolling = cls(columns, windows)
+        if df.empty: return rolling
+        cal = to_calendar(df, columns)
+        steps = cal[columns].diff().iloc[1:].to_numpy()
+        for w in rolling.windows: rolling.sums[w] = steps[-w:].sum(axis=0) if len(steps) else np.zeros(len(columns))
+        rolling.steps.extend(steps[-rolling.steps.maxlen:])
+        rolling.last_date = cal.index[-1]
+        rolling.last_values = cal[columns].iloc[-1].to_numpy()
+        # 最后一天之前那个真实 (非插值) 的日子，当天重新抓取时据此改写
+        observed = cal.index[~cal["Is_Gap"]]
+        if len(observed) > 1:
+            rolling.prev_gap_days = (observed[-1] - observed[-2]).days
+            rolling.last_gap = min(rolling.prev_gap_days, rolling.steps.maxlen)
+            rolling.prev_values = cal.loc[observed[-2], columns].to_numpy(dtype="float64")
+        return rolling
+
+# --- 多分辨率汇总 + 降采样 (给图表用) ---
+# 周/月汇总: 累计值取区间内最后一天，日增量取区间内的日均值; Date 为区间内最后一个有数据的日子
+ROLLUP_FREQS = {"W": "W-SUN", "M": "M"}
+# 按所选时间跨度挑分辨率: 不超过 120 天看每日，不超过两年看每周，再长看每月
+RESOLUTION_SPANS = ((120, "D"), (730, "W"))
+POINT_BUDGET = 200  # 每条线最多的点数
+
+def rollup(df, freq, last_columns=(), mean_columns=()):
+    if df.empty: return df.copy()
+    periods = pd.to_datetime(df["Date"]).dt.to_period(ROLLUP_FREQS[freq])
+    agg = {"Date": "last", **{c: "last" for c in last_columns}, **{c: "mean" for c in mean_columns}}
+    return df.groupby(periods.values, sort=True).agg(agg).reset_index(drop=True)
+
+def pick_resolution(span_days):
+    for limit, resolution in RESOLUTION_SPANS:
+        if span_days <= limit: return resolution
+    return "M"
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: 保留视觉上最重要的 threshold 个点的下标 (含首尾)
+    n = len(x)
+    if threshold >= n or threshold < 3: return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    every = (n - 2) / (threshold - 2)
+    picked = np.empty(threshold, dtype="int64")
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_end <= end: avg_x, avg_y = x[-1], y[-1]
+        else: avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+def downsample(df, columns, budget=POINT_BUDGET):
+    # 每一列各自做 LTTB，保留所有被选中的行 (多条线共用同一张宽表)
+    if len(df) <= budget: return df
+    x = (pd.to_datetime(df["Date"]) - pd.Timestamp("1970-01-01")).dt.days.to_numpy()
+    keep = set()
+    for c in columns:
+        y = df[c].to_numpy(dtype="float64")
+        keep.update(lttb_indices(x, np.nan_to_num(y), budget).tolist())
+    return df.iloc[sorted(keep)].reset_index(drop=True)
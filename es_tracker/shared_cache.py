@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+import pickle
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from .config import CACHE_DIR_PATH
+
+# --- 跨进程共享缓存 ---
+# st.cache_data 只在单个进程里有效; 同时跑多个 Streamlit 进程 / 副本时，抓取 kworb 和重建历史聚合
+# 要靠这里的锁和共享条目做到每个数据版本只做一次:
+#   cache = shared_cache.get_cache()
+#   with cache.lock("ingest"): ...          跨进程互斥
+#   cache.get(key) / cache.set(key, value, ttl=秒)   任意可 pickle 的值
+# 默认是本机目录 (同一台机器上的进程共用，文件锁); 设置 ES_SHARED_CACHE=redis://host:6379/0
+# 时改用 Redis (需要另外装 redis 包，多台机器上的副本共用)
+SHARED_CACHE_URL = os.environ.get("ES_SHARED_CACHE", "")
+SHARED_CACHE_DIR = os.path.join(CACHE_DIR_PATH, "shared")
+LOCK_TTL = 600  # 秒; Redis 锁的过期时间，持有锁的进程崩了也不会永远锁住
+
+try: import fcntl
+except ImportError: fcntl = None  # 没有 fcntl 的平台 (Windows) 退化成进程内的锁
+
+class DiskCache:
+    # 每个键一个 pickle 文件，先写临时文件再 rename; 锁是 <目录>/<键>.lock 上的 flock，进程退出时自动释放
+    local = True  # 和历史库在同一个文件系统上: 历史聚合本身的落盘文件已经是共享的
+
+    def __init__(self, path=SHARED_CACHE_DIR):
+        self.path = path
+        self._thread_locks = {}
+        self._guard = threading.Lock()
+
+    def _file(self, key, suffix):
+        return os.path.join(self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, key):
+        try:
+            with open(self._file(key, ".pkl"), "rb") as f: expires, value = pickle.load(f)
+        except Exception: return None
+        return None if expires is not None and expires < time.time() else value
+
+    def set(self, key, value, ttl=None):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(key, ".pkl")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f: pickle.dump((time.time() + ttl if ttl else None, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try: os.remove(self._file(key, ".pkl"))
+        except FileNotFoundError: pass
+
+    @contextmanager
+    def lock(self, name):
+        if fcntl is None:
+            with self._guard: lk = self._thread_locks.setdefault(name, threading.Lock())
+            with lk: yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # 每次都新开文件描述符: 同一进程里的不同线程之间也互斥
+        with open(self._file(name, ".lock"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try: yield
+            finally: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class RedisCache:
+    # 任何兼容 Redis 协议的服务; 锁是 SET NX PX + 按令牌删除
+    local = False
+    PREFIX = "es_tracker:"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(self.PREFIX + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.PREFIX + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.PREFIX + key)
+
+    @contextmanager
+    def lock(self, name, ttl=LOCK_TTL, poll=0.1):
+        key, token = f"{self.PREFIX}lock:{name}", uuid.uuid4().hex
+        while not self.client.set(key, token, nx=True, px=int(ttl * 1000)): time.sleep(poll)
+        try: yield
+        finally: self.client.eval(self._RELEASE, 1, key, token)
+
+def open_cache(url=""):
+    # "" = 默认目录; "file:///some/dir" 或目录路径 = 指定目录; "redis://..." / "rediss://..." = Redis
+    if url.startswith(("redis://", "rediss://", "unix://")): return RedisCache(url)
+    if url.startswith("file://"): url = url[len("file://"):]
+    return DiskCache(url or SHARED_CACHE_DIR)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    # 每个进程一个实例
+    global _cache
+    with _cache_lock:
+        if _cache is None: _cache = open_cache(SHARED_CACHE_URL)
+        return _cache
@@ -0,0 +1,357 @@
+import os
+import glob
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from . import shared_cache
+from .config import DATA_DIR_PATH, STORE_DIR_PATH
+from .utils import clean_number, fix_encoding
+
+# --- 按月分区的追加式历史库 ---
+# 每个月一个 Parquet 文件: store/2025-12.parquet, 每行 = (某天, 某首歌)
+# 新的一天追加进对应月份的分区; 同一天重复写入时整天替换
+# 歌名入库前已修正编码; Track_ID 是 kworb 链接里的 Spotify 曲目 ID (老数据为空)，逐日对齐和单曲历史都按它做键
+STORE_SCHEMA = pa.schema([
+    ("Date", pa.string()),
+    ("Song", pa.string()),
+    ("Track_ID", pa.string()),
+    ("Streams_Num", pa.int64()),
+    ("Daily_Raw", pa.int64()),
+    # 派生列 (es_tracker.metrics)，入库时相对前一天算好
+    ("Daily_Num", pa.int64()),
+    ("Streams_Num_Prev", pa.int64()),
+    ("Daily_Prev_Day", pa.int64()),
+    ("Daily_Diff", pa.int64()),
+    ("Daily_Percent_Change", pa.float64()),
+])
+STORE_COLUMNS = STORE_SCHEMA.names
+RAW_COLUMNS = ["Song", "Track_ID", "Streams_Num", "Daily_Raw"]
+
+def partition_path(month, store_dir=STORE_DIR_PATH):
+    return os.path.join(store_dir, f"{month}.parquet")
+
+def list_partitions(store_dir=STORE_DIR_PATH):
+    # 返回 [(月份, 路径)]，按月份排序
+    if not os.path.isdir(store_dir): return []
+    parts = []
+    for name in sorted(os.listdir(store_dir)):
+        if name.endswith(".parquet"):
+            parts.append((name[:-len(".parquet")], os.path.join(store_dir, name)))
+    return parts
+
+def _month_in_range(month, start, end):
+    if start and month < start[:7]: return False
+    if end and month > end[:7]: return False
+    return True
+
+def read_history(columns=None, start=None, end=None, store_dir=STORE_DIR_PATH):
+    # 只读需要的列，并按月份裁剪分区、按日期过滤行
+    columns = list(columns) if columns else list(STORE_COLUMNS)
+    if "Date" not in columns: columns = ["Date"] + columns
+    filters = []
+    if start: filters.append(("Date", ">=", start))
+    if end: filters.append(("Date", "<=", end))
+
+    tables = []
+    for month, path in list_partitions(store_dir):
+        if not _month_in_range(month, start, end): continue
+        # 按 STORE_SCHEMA 读: 升级前的老分区里没有的列读出来是空值
+        tables.append(pq.read_table(path, columns=columns, filters=filters or None, schema=STORE_SCHEMA, memory_map=True))
+
+    if not tables: return pd.DataFrame(columns=columns)
+    return pa.concat_tables(tables).to_pandas()
+
+def read_partition(month, columns=None, store_dir=STORE_DIR_PATH):
+    columns = list(columns) if columns else list(STORE_COLUMNS)
+    if "Date" not in columns: columns = ["Date"] + columns
+    return pq.read_table(partition_path(month, store_dir), columns=columns, schema=STORE_SCHEMA, memory_map=True).to_pandas()
+
+def list_dates(store_dir=STORE_DIR_PATH):
+    dates = read_history(columns=["Date"], store_dir=store_dir)["Date"]
+    return sorted(dates.unique())
+
+def latest_date(before=None, store_dir=STORE_DIR_PATH):
+    # 最近一天 (可选: 严格早于 before)
+    for month, path in reversed(list_partitions(store_dir)):
+        if before and month > before[:7]: continue
+        dates = pq.read_table(path, columns=["Date"], memory_map=True).column("Date").to_pylist()
+        if before: dates = [d for d in dates if d < before]
+        if dates: return max(dates)
+    return None
+
+def read_day(date_str, columns=None, store_dir=STORE_DIR_PATH):
+    df = read_history(columns=columns, start=date_str, end=date_str, store_dir=store_dir)
+    return df.drop(columns=["Date"]).reset_index(drop=True)
+
+def _derived_defaults(out):
+    # 还没有前一天可比时的取值 (与 metrics.derive_daily_metrics 无前一天时一致)
+    return {
+        "Daily_Num": out["Daily_Raw"], "Streams_Num_Prev": 0, "Daily_Prev_Day": 0,
+        "Daily_Diff": out["Daily_Raw"], "Daily_Percent_Change": 0.0,
+    }
+
+def _to_store_frame(date_str, df):
+    out = pd.DataFrame({
+        "Date": date_str,
+        "Song": df["Song"].astype(str),
+        "Track_ID": df["Track_ID"].where(df["Track_ID"].notna(), None).astype(object) if "Track_ID" in df.columns else None,
+        "Streams_Num": df["Streams_Num"].fillna(0).astype("int64"),
+        "Daily_Raw": df["Daily_Raw"].fillna(0).astype("int64") if "Daily_Raw" in df.columns else 0,
+    })
+    for c, default in _derived_defaults(out).items():
+        out[c] = df[c].fillna(0).values if c in df.columns else default
+    out = out.astype({f.name: f.type.to_pandas_dtype() for f in STORE_SCHEMA})
+    return pa.Table.from_pandas(out[STORE_COLUMNS], schema=STORE_SCHEMA, preserve_index=False)
+
+def _read_table(path):
+    # 旧分区缺列时补齐 (派生列按默认值，Track_ID 为空，歌名修正编码)，读出来的表总是完整的 STORE_SCHEMA
+    table = pq.read_table(path)
+    if all(c in table.column_names for c in STORE_COLUMNS): return table.select(STORE_COLUMNS).cast(STORE_SCHEMA)
+    df = table.to_pandas()
+    df["Song"] = df["Song"].map(fix_encoding)
+    out = [_to_store_frame(d, day) for d, day in df.groupby("Date", sort=True)]
+    return pa.concat_tables(out) if out else STORE_SCHEMA.empty_table()
+
+def _outdated(path):
+    return not all(c in pq.read_schema(path).names for c in STORE_COLUMNS)
+
+def needs_upgrade(store_dir=STORE_DIR_PATH):
+    return any(_outdated(path) for _, path in list_partitions(store_dir))
+
+def upgrade_partitions(store_dir=STORE_DIR_PATH):
+    # 把缺列的老分区按 _read_table 补齐后原地重写; 返回重写的月份
+    upgraded = []
+    with _write_lock:
+        for month, path in list_partitions(store_dir):
+            if not _outdated(path): continue
+            _write_partition(_read_table(path), path)
+            upgraded.append(month)
+    return upgraded
+
+def _write_partition(table, path):
+    # 先写临时文件再 rename，读者永远不会看到写了一半的分区; 临时文件名按进程/线程区分，并发写不会互相覆盖
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def content_hash(table):
+    # 某天快照的内容指纹，与行顺序无关
+    df = table.select(STORE_COLUMNS[1:]).to_pandas().sort_values(["Song", "Track_ID"], kind="stable")
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+# 同一进程内的分区 "读-改-写" 串行执行
+_write_lock = threading.Lock()
+
+# 跨进程 / 副本: 抓取入库 (ingest._refresh_shared)、迁移、重算、重放、回填这些整批写入拿同一把共享锁。
+# 锁不可重入，拿着锁时不要再调用 ensure_store
+WRITER_LOCK_NAME = "ingest"
+
+def writer_lock():
+    return shared_cache.get_cache().lock(WRITER_LOCK_NAME)
+
+def append_days(days, store_dir=STORE_DIR_PATH, aliases=True):
+    # days: {date_str: DataFrame(Song, Streams_Num, Daily_Raw [, 派生列])}，按月份合并后每个分区只重写一次。
+    # 与库中已有内容完全相同的日期直接跳过，整个月都没变化时分区文件不动 (mtime 不变，下游缓存继续有效)。
+    # aliases=False 时不碰别名表，由调用方之后统一 update_aliases (重放的子进程)。返回实际写入的日期
+    by_month = {}
+    for date_str, df in days.items():
+        by_month.setdefault(date_str[:7], {})[date_str] = _to_store_frame(date_str, df)
+
+    written = []
+    with _write_lock:
+        for month, new_days in by_month.items():
+            path = partition_path(month, store_dir)
+            old = _read_table(path) if os.path.exists(path) else None
+            if old is not None:
+                for date_str in list(new_days):
+                    old_day = old.filter(pc.equal(old.column("Date"), date_str))
+                    if old_day.num_rows and content_hash(old_day) == content_hash(new_days[date_str]):
+                        del new_days[date_str]
+            if not new_days: continue
+
+            new_table = pa.concat_tables(list(new_days.values()))
+            if old is not None:
+                keep = pc.invert(pc.is_in(old.column("Date"), value_set=pa.array(sorted(new_days))))
+                new_table = pa.concat_tables([old.filter(keep), new_table])
+            new_table = new_table.sort_by([("Date", "ascending")])
+            _write_partition(new_table, path)
+            written.extend(sorted(new_days))
+        if written and aliases: _update_aliases({d: days[d] for d in written}, store_dir)
+    return written
+
+def append_day(date_str, df, store_dir=STORE_DIR_PATH):
+    return append_days({date_str: df}, store_dir=store_dir)
+
+# --- 曲目别名表 ---
+# store/_tracks.json: {Track_ID: {"name": 最近一次见到的歌名, "aliases": [见过的所有歌名], "seen": 最近见到的日期,
+#                                 "claims": [这首曲目认领的歌名]}}
+# 改名的曲目按 ID 归到一起，显示用最新的歌名。某个歌名第一次带着 ID 出现时，累计播放最大的那首曲目认领它:
+# 没有 ID 的老数据按认领关系归到这首曲目 (与 metrics 里前一天没有 ID 时按歌名对齐的规则一致)
+TRACKS_FILE_NAME = "_tracks.json"
+NAME_KEY_PREFIX = "name:"  # 没有 ID 也没被认领的歌名，用歌名做键
+
+def aliases_path(store_dir=STORE_DIR_PATH):
+    return os.path.join(store_dir, TRACKS_FILE_NAME)
+
+def read_aliases(store_dir=STORE_DIR_PATH):
+    try:
+        with open(aliases_path(store_dir), encoding="utf-8") as f: return json.load(f)
+    except Exception: return {}
+
+def _claims(tracks):
+    return {name: track_id for track_id, t in tracks.items() for name in t.get("claims", [])}
+
+def _update_aliases(days, store_dir):
+    # 在 _write_lock 里调用; 没有任何变化时不重写
+    tracks = read_aliases(store_dir)
+    claimed = _claims(tracks)
+    changed = False
+    for date_str in sorted(days):
+        df = days[date_str]
+        if "Track_ID" not in df.columns: continue
+        rows = df.loc[df["Track_ID"].notna(), ["Track_ID", "Song", "Streams_Num"]].sort_values("Streams_Num", ascending=False, kind="stable")
+        for track_id, song, _ in rows.itertuples(index=False):
+            t = tracks.setdefault(track_id, {"name": song, "aliases": [], "seen": "", "claims": []})
+            if song not in t["aliases"]:
+                t["aliases"].append(song)
+                changed = True
+            if song not in claimed:
+                claimed[song] = track_id
+                t["claims"].append(song)
+                changed = True
+            # 补导入更早的日子时不会把显示名改回旧名
+            if date_str > t["seen"] or (date_str == t["seen"] and t["name"] != song):
+                t["name"], t["seen"] = song, date_str
+                changed = True
+    if not changed: return
+    path = aliases_path(store_dir)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f: json.dump(tracks, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def update_aliases(days, store_dir=STORE_DIR_PATH):
+    # 分区已经写好 (append_days(..., aliases=False)) 之后补记别名; days 只需要 Track_ID, Song, Streams_Num 三列。
+    # 认领关系取决于日期先后，所以要在一个进程里按日期顺序做，不能交给并行的子进程各写各的
+    with _write_lock: _update_aliases(days, store_dir)
+
+def aliases_version(tracks):
+    # 只看会影响曲目键和显示名的部分 (不含 seen)，每天的抓取不会让它变
+    return hashlib.sha1(json.dumps({k: (t["name"], t["claims"]) for k, t in tracks.items()}, sort_keys=True).encode()).hexdigest()[:16]
+
+def track_keys(songs, track_ids, tracks):
+    # 每行的曲目键: 有 ID 用 ID; 没有时用认领这个歌名的曲目 ID，没人认领用 "name:歌名"
+    claimed = _claims(tracks)
+    codes, uniques = pd.factorize(pd.Series(songs, dtype=object))
+    fallback = np.array([claimed.get(n, NAME_KEY_PREFIX + n) for n in uniques], dtype=object)
+    keys = pd.Series(track_ids, dtype=object).to_numpy().copy()
+    missing = pd.isna(keys)
+    keys[missing] = fallback[codes[missing]]
+    return keys
+
+def display_names(keys, tracks):
+    # 曲目键 -> 显示用歌名; 不同曲目同名时，认领了这个歌名的那首保留原名，其余在后面带上 ID 区分
+    claimed = _claims(tracks)
+    names = np.array([k[len(NAME_KEY_PREFIX):] if k.startswith(NAME_KEY_PREFIX) else tracks.get(k, {}).get("name", k) for k in keys], dtype=object)
+    dup = pd.Series(names).duplicated(keep=False).to_numpy()
+    for i in np.nonzero(dup)[0]:
+        if not keys[i].startswith(NAME_KEY_PREFIX) and claimed.get(names[i]) != keys[i]: names[i] = f"{names[i]} ({keys[i]})"
+    return names
+
+# --- 日内快照日志 ---
+# 每天的分区只保存当天最新的一份; 当天每一份内容不同的快照另外追加到 intraday/<日期>.csv
+INTRADAY_DIR_NAME = "intraday"
+
+def append_intraday(date_str, df, fetched_at, store_dir=STORE_DIR_PATH):
+    log_dir = os.path.join(store_dir, INTRADAY_DIR_NAME)
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{date_str}.csv")
+    out = df[RAW_COLUMNS].copy()
+    out.insert(0, "Fetched_At", datetime.fromtimestamp(fetched_at).isoformat(timespec="seconds"))
+    with _write_lock:
+        exists = os.path.exists(log_path)
+        # 升级当天已有的日志沿用它原来的列
+        if exists: out = out.reindex(columns=pd.read_csv(log_path, nrows=0).columns)
+        out.to_csv(log_path, mode="a", header=not exists, index=False)
+
+# --- 旧版 CSV 一次性迁移 ---
+def _read_legacy_csv(path):
+    df = pd.read_csv(path)
+    df['Song'] = df['Song'].map(fix_encoding)
+    if 'Daily_Raw' in df.columns:
+        df['Daily_Raw'] = df['Daily_Raw'].fillna(0).astype(int)
+    else:
+        df['Daily_Raw'] = 0
+    if 'Streams_Num' not in df.columns:
+        df['Streams_Num'] = df['Streams'].apply(clean_number)
+    return df
+
+def migrate_csvs(data_dir=DATA_DIR_PATH, store_dir=STORE_DIR_PATH, overwrite=False):
+    # 把 es_data/*.csv 导入历史库; 默认跳过库中已有的日期，可重复执行
+    existing = set() if overwrite else set(list_dates(store_dir))
+    days = {}
+    for f in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        date_str = os.path.basename(f).replace(".csv", "")
+        if date_str in existing: continue
+        try: days[date_str] = _read_legacy_csv(f)
+        except Exception as e: print(f"skip {f}: {e}")
+    if days:
+        append_days(days, store_dir=store_dir)
+        # 导入的日期及其之后的派生列都要按新的前一天重算
+        recompute(start=min(days), store_dir=store_dir)
+    return sorted(days)
+
+# --- 派生列重算 ---
+def recompute(start=None, store_dir=STORE_DIR_PATH):
+    # 按日期顺序用 "前一天" 重算 start 及之后每一天的派生列; 结果没变的日期/月份不会重写
+    from .metrics import derive_daily_metrics
+    dates = list_dates(store_dir)
+    if start: dates = [d for d in dates if d >= start]
+    if not dates: return []
+    prev_date = latest_date(before=dates[0], store_dir=store_dir)
+    df = read_history(columns=RAW_COLUMNS, start=prev_date or dates[0], end=dates[-1], store_dir=store_dir)
+    by_date = {d: day.drop(columns=["Date"]) for d, day in df.groupby("Date", sort=True)}
+
+    days = {}
+    prev_df = by_date.get(prev_date)
+    for d in dates:
+        days[d] = derive_daily_metrics(by_date[d], prev_df)
+        prev_df = by_date[d]
+    return append_days(days, store_dir=store_dir)
+
+def ensure_store(data_dir=DATA_DIR_PATH, store_dir=STORE_DIR_PATH):
+    # 首次运行 (库为空) 时自动迁移; 旧格式分区 (缺列) 补齐后派生列补算一遍。
+    # 每次页面渲染都会调用: 库已就绪时只看一眼，不拿锁; 要写时拿写锁，拿到后再确认一次
+    if list_partitions(store_dir) and not needs_upgrade(store_dir): return
+    with writer_lock():
+        if not list_partitions(store_dir): migrate_csvs(data_dir, store_dir)
+        elif needs_upgrade(store_dir):
+            upgrade_partitions(store_dir)
+            recompute(store_dir=store_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ES Tracker history store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_mig = sub.add_parser("migrate", help="import es_data/*.csv into the monthly Parquet store")
+    p_mig.add_argument("--overwrite", action="store_true", help="re-import dates already in the store")
+    p_rec = sub.add_parser("recompute", help="recompute derived daily metrics for stored days")
+    p_rec.add_argument("--start", help="first date to recompute (YYYY-MM-DD), default: all days")
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        with writer_lock(): imported = migrate_csvs(overwrite=args.overwrite)
+        print(f"imported {len(imported)} day(s) into {STORE_DIR_PATH}")
+    elif args.cmd == "recompute":
+        with writer_lock(): written = recompute(start=args.start)
+        print(f"recomputed {len(written)} changed day(s) in {STORE_DIR_PATH}")
@@ -0,0 +1,10 @@
+# --- 工具函数 ---
+def clean_number(x):
+    try: return int(str(x).replace(',', '').replace('+', '').split('.')[0])
+    except: return 0
+
+def fix_encoding(s):
+    if not isinstance(s, str): return s
+    s = s.replace("â€™", "'").replace("â\x80\x99", "'").replace("’", "'")
+    s = s.replace("â€“", "-").replace("â\x80\x93", "-").replace("–", "-")
+    return s